@@ -1,6 +1,78 @@
 import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from instrumentation import measure
 
-def post_csv_to_api(file_path, token, canvas_url, account_id):
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+FINISHED_STATES = {'imported', 'imported_with_messages', 'failed', 'failed_with_messages', 'aborted', 'restored', 'partially_restored'}
+SUCCESS_STATES = {'imported', 'imported_with_messages'}
+# Canvas throttles each token with a leaky bucket; back off before it runs dry
+RATE_LIMIT_FLOOR = 100
+RATE_LIMIT_PAUSE = 1.0
+# Longest Retry-After honoured, so one bad header cannot stall a run
+MAX_RETRY_AFTER = 300
+
+def _base_url(canvas_url):
+    """Canvas is addressed by host name over HTTPS; a full URL (e.g. a local stub server) is used as given."""
+    if '://' in canvas_url:
+        return canvas_url.rstrip('/')
+    return f"https://{canvas_url}"
+
+def _is_rate_limited(response):
+    # Canvas reports an exhausted rate limit as 403 rather than 429
+    return response.status_code == 403 and 'Rate Limit Exceeded' in response.text
+
+def _retry_delay(response, attempt, backoff):
+    """Seconds to wait before retrying, preferring the server's Retry-After header up to MAX_RETRY_AFTER."""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.replace('.', '', 1).isdigit():
+            return min(float(retry_after), MAX_RETRY_AFTER)
+    return backoff * 2 ** attempt
+
+def create_session(token, pool_size=10):
+    """Create a session that reuses pooled connections and sends the bearer token with every request."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Authorization'] = f'Bearer {token}'
+    return session
+
+def request_with_retry(session, method, url, retries=5, backoff=1.0, timeout=60, **kwargs):
+    """
+    Send a request, retrying rate-limited, 5xx and connection failures with exponential backoff.
+
+    Returns:
+        Response object from the last attempt.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(_retry_delay(None, attempt, backoff))
+            continue
+        if attempt == retries or not (response.status_code in RETRY_STATUSES or _is_rate_limited(response)):
+            break
+        time.sleep(_retry_delay(response, attempt, backoff))
+
+    remaining = response.headers.get('X-Rate-Limit-Remaining')
+    if remaining is not None and float(remaining) < RATE_LIMIT_FLOOR:
+        time.sleep(RATE_LIMIT_PAUSE)
+    return response
+
+def _post_sis_import(data, content_type, token, canvas_url, account_id, session=None):
+    url = f"{_base_url(canvas_url)}/api/v1/accounts/{account_id}/sis_imports.json?import_type=instructure_csv"
+    headers = {'Content-Type': content_type}
+    if session is None:
+        with create_session(token, pool_size=1) as session:
+            return request_with_retry(session, 'POST', url, headers=headers, data=data)
+    return request_with_retry(session, 'POST', url, headers=headers, data=data)
+
+def post_csv_to_api(file_path, token, canvas_url, account_id, session=None):
     """
     Post a CSV file to the Canvas API endpoint.
 
@@ -9,15 +81,92 @@ def post_csv_to_api(file_path, token, canvas_url, account_id):
         token (str): Bearer token for authorization.
         canvas_url (str): Base URL of the Canvas instance.
         account_id (str): Account ID for the SIS import.
+        session (requests.Session): Optional session to reuse; its own token is used when given.
 
     Returns:
         Response object from the API request.
     """
-    url = f"https://{canvas_url}/api/v1/accounts/{account_id}/sis_imports.json?import_type=instructure_csv"
-    headers = {
-        'Content-Type': 'text/csv',
-        'Authorization': f'Bearer {token}'
-    }
+    # Read the body up front so retries can resend it
     with open(file_path, 'rb') as f:
-        response = requests.post(url, headers=headers, data=f)
-    return response
\ No newline at end of file
+        data = f.read()
+    return _post_sis_import(data, 'text/csv', token, canvas_url, account_id, session)
+
+def post_zip_to_api(zip_bytes, token, canvas_url, account_id, session=None):
+    """
+    Post a zip of SIS CSV files to the Canvas API endpoint as a single import.
+
+    Args:
+        zip_bytes (bytes): Zip archive holding courses.csv, enrollments.csv, etc.
+        token (str): Bearer token for authorization.
+        canvas_url (str): Base URL of the Canvas instance.
+        account_id (str): Account ID for the SIS import.
+        session (requests.Session): Optional session to reuse; its own token is used when given.
+
+    Returns:
+        Response object from the API request.
+    """
+    return _post_sis_import(zip_bytes, 'application/zip', token, canvas_url, account_id, session)
+
+def wait_for_sis_import(session, canvas_url, account_id, import_id, poll_interval=5, timeout=3600):
+    """
+    Poll a SIS import until Canvas reports a finished workflow state or the timeout passes.
+
+    Returns:
+        dict: The last SIS import object returned by Canvas.
+    """
+    url = f"{_base_url(canvas_url)}/api/v1/accounts/{account_id}/sis_imports/{import_id}"
+    deadline = time.monotonic() + timeout
+    while True:
+        response = request_with_retry(session, 'GET', url)
+        response.raise_for_status()
+        sis_import = response.json()
+        if sis_import.get('workflow_state') in FINISHED_STATES or time.monotonic() > deadline:
+            return sis_import
+        time.sleep(poll_interval)
+
+def _post_and_wait(session, file_path, canvas_url, account_id, poll_interval):
+    with measure('post_csv', file=file_path) as record:
+        response = post_csv_to_api(file_path, None, canvas_url, account_id, session=session)
+        if not response.ok:
+            record['workflow_state'] = 'not_posted'
+            return {'workflow_state': 'not_posted', 'status_code': response.status_code, 'message': response.text}
+        sis_import = wait_for_sis_import(session, canvas_url, account_id, response.json()['id'], poll_interval)
+        record['workflow_state'] = sis_import.get('workflow_state')
+        return sis_import
+
+def post_csvs_concurrently(file_paths, token, canvas_url, account_id, max_concurrency=4, poll_interval=5):
+    """
+    Post several CSV files as separate SIS imports and wait for each import to finish.
+    At most max_concurrency imports are posted or running at once, over a shared connection pool.
+
+    Returns:
+        dict: Final SIS import object for each file path, in the order given.
+    """
+    with create_session(token, pool_size=max_concurrency) as session, ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            file_path: executor.submit(_post_and_wait, session, file_path, canvas_url, account_id, poll_interval)
+            for file_path in file_paths
+        }
+        results = {}
+        for file_path, future in futures.items():
+            try:
+                results[file_path] = future.result()
+            except Exception as e:
+                results[file_path] = {'workflow_state': 'not_posted', 'message': str(e)}
+        return results
+
+def post_zip_and_wait(zip_bytes, token, canvas_url, account_id, poll_interval=5):
+    """
+    Post a zip of SIS CSV files as one import and wait for it to finish.
+
+    Returns:
+        dict: Final SIS import object, or a not_posted state with the error response.
+    """
+    with create_session(token, pool_size=1) as session, measure('post_bundle', bytes=len(zip_bytes)) as record:
+        response = post_zip_to_api(zip_bytes, None, canvas_url, account_id, session=session)
+        if not response.ok:
+            record['workflow_state'] = 'not_posted'
+            return {'workflow_state': 'not_posted', 'status_code': response.status_code, 'message': response.text}
+        sis_import = wait_for_sis_import(session, canvas_url, account_id, response.json()['id'], poll_interval)
+        record['workflow_state'] = sis_import.get('workflow_state')
+        return sis_import
@@ -0,0 +1,195 @@
+"""
+Run the sync for several schools from one manifest.
+
+Each school has its own input tree, output tree and Canvas account. The shared staff export
+is parsed once here; schools then run in parallel worker processes forked from this one, so
+they start with pandas, the pipeline modules and the staff name index already loaded.
+Each school's log goes to sync.log in its output root.
+
+    python batch_runner.py schools.json
+    python batch_runner.py schools.json --max-workers 2 --report batch_report.json
+
+A manifest lists the schools, options shared by all of them, and the shared staff export:
+
+    {
+        "teacher_ids": "shared/teacher_ids.csv",
+        "defaults": {"all_terms": true, "incremental": true},
+        "schools": [
+            {"name": "north", "root": "north", "canvas_url": "https://north.instructure.com",
+             "canvas_account_id": "1", "token_env": "NORTH_CANVAS_API_TOKEN"},
+            {"name": "south", "root": "south", "bundle": true, "dry_run": true}
+        ]
+    }
+
+Any cli.py option can be set by its long name with underscores (input_root, terms, bundle, ...).
+input_root, output_root, stage_dir and cache_dir default to temp_inputs, temp_outputs, temp_stages and
+temp_cache under the school's root. Relative school paths are taken from its root, other paths from the manifest's directory.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout, redirect_stderr
+from datetime import datetime, timezone
+import cli
+import instrumentation
+import main  # Loaded before the workers fork, so they start with pandas and the pipeline imported
+from file_handling import CACHE_DIR
+from teacher_resolver import load_name_index, load_staff
+
+# Manifest keys that describe the school rather than set a cli.py option
+SCHOOL_KEYS = {'name', 'root', 'canvas_url', 'canvas_account_id', 'token_env'}
+PATH_OPTIONS = ['input_root', 'output_root', 'stage_dir', 'cache_dir', 'teacher_ids', 'report', 'profile']
+CREDENTIALS = ['CANVAS_API_TOKEN', 'CANVAS_URL', 'CANVAS_ACCOUNT_ID']
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('manifest', help="JSON manifest listing the schools to sync")
+    parser.add_argument('--max-workers', type=int, help="schools synced at once (default: manifest max_workers, else one per CPU)")
+    parser.add_argument('--report', metavar='PATH', help="write each school's exit code, imports and stage timings to this JSON file")
+    return parser
+
+def load_manifest(manifest_path):
+    """
+    Read a batch manifest and resolve each school's options.
+
+    Returns:
+        tuple: (schools, teacher_ids, max_workers), with every school's paths made absolute.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    teacher_ids = manifest.get('teacher_ids')
+    if teacher_ids:
+        teacher_ids = os.path.join(base_dir, teacher_ids)
+
+    schools = []
+    for entry in manifest['schools']:
+        school = {**manifest.get('defaults', {}), **entry}
+        root = os.path.join(base_dir, school.get('root', school['name']))
+        school.setdefault('input_root', 'temp_inputs')
+        school.setdefault('output_root', 'temp_outputs')
+        school.setdefault('stage_dir', 'temp_stages')
+        school.setdefault('cache_dir', 'temp_cache')
+        if teacher_ids:
+            school.setdefault('teacher_ids', teacher_ids)
+        for option in PATH_OPTIONS:
+            if school.get(option):
+                school[option] = os.path.join(root, school[option])
+        school_args(school)  # Fail on unknown options before any school starts
+        schools.append(school)
+    return schools, teacher_ids, manifest.get('max_workers')
+
+def school_args(school):
+    """cli.py arguments for a school: the parser defaults overridden by its manifest options."""
+    args = cli.build_parser().parse_args([])
+    options = {key: value for key, value in school.items() if key not in SCHOOL_KEYS}
+    unknown = set(options) - set(vars(args))
+    if unknown:
+        raise ValueError(f"School {school['name']}: unknown options {', '.join(sorted(unknown))}")
+    vars(args).update(options)
+    return args
+
+def school_credentials(school, environ=os.environ):
+    """Canvas credentials for a school; settings it leaves out fall back to the CANVAS_* variables."""
+    credentials = {name: environ.get(name) for name in CREDENTIALS}
+    if school.get('token_env'):
+        credentials['CANVAS_API_TOKEN'] = environ.get(school['token_env'])
+    if school.get('canvas_url'):
+        credentials['CANVAS_URL'] = school['canvas_url']
+    if school.get('canvas_account_id'):
+        credentials['CANVAS_ACCOUNT_ID'] = str(school['canvas_account_id'])
+    return credentials
+
+def run_school(school, environ):
+    """Run one school's stages in a worker process and return its result."""
+    instrumentation.reset()
+    args = school_args(school)
+    # Workers are reused across schools, so credentials are always set from the batch's own environment
+    for name, value in school_credentials(school, environ).items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+    os.makedirs(args.output_root, exist_ok=True)
+    log_path = os.path.join(args.output_root, 'sync.log')
+    started = time.perf_counter()
+    error = None
+    with open(log_path, 'w') as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            exit_code = cli.run(args)
+        except Exception as e:
+            traceback.print_exc()
+            exit_code, error = 1, f"{type(e).__name__}: {e}"
+    records = instrumentation.records()
+    return {
+        'name': school['name'],
+        'exit_code': exit_code,
+        'error': error,
+        'wall_seconds': round(time.perf_counter() - started, 4),
+        'log': log_path,
+        'imports': [record for record in records if record['stage'] in ('post_csv', 'post_bundle')],
+        'stages': records,
+    }
+
+def _fork_context():
+    # Forked workers inherit the loaded modules and staff index instead of importing and parsing them again
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
+
+def run_batch(schools, teacher_ids=None, max_workers=None):
+    """
+    Sync each school in a pool of at most max_workers processes.
+
+    Returns:
+        list: Each school's result, in manifest order.
+    """
+    if teacher_ids and schools:
+        # Workers find the staff export and its index in memory, whichever cache directory they use
+        load_staff(teacher_ids)
+        load_name_index(teacher_ids, schools[0].get('cache_dir', CACHE_DIR))
+    max_workers = min(len(schools), max_workers or os.cpu_count() or 1)
+    print(f"Syncing {len(schools)} schools, {max_workers} at a time")
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=_fork_context()) as executor:
+        futures = {executor.submit(run_school, school, dict(os.environ)): school['name'] for school in schools}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died; the school's log may be incomplete
+                result = {'name': name, 'exit_code': 1, 'error': f"{type(e).__name__}: {e}", 'imports': [], 'stages': []}
+            results[name] = result
+            states = ', '.join(str(record.get('workflow_state')) for record in result['imports']) or 'nothing posted'
+            print(f"{name}: exit code {result['exit_code']} ({states})" + (f" - {result['error']}" if result['error'] else ''))
+    return [results[school['name']] for school in schools]
+
+def main_batch(argv=None):
+    args = build_parser().parse_args(argv)
+    schools, teacher_ids, max_workers = load_manifest(args.manifest)
+    started_at = datetime.now(timezone.utc).isoformat()
+    started = time.perf_counter()
+    results = run_batch(schools, teacher_ids, args.max_workers or max_workers)
+    wall_seconds = round(time.perf_counter() - started, 4)
+    slowest = max((result.get('wall_seconds', 0) for result in results), default=0)
+    print(f"Synced {len(results)} schools in {wall_seconds:.1f}s (slowest school {slowest:.1f}s)")
+
+    if args.report:
+        if os.path.dirname(args.report):
+            os.makedirs(os.path.dirname(args.report), exist_ok=True)
+        with open(args.report, 'w') as f:
+            json.dump({'started_at': started_at, 'wall_seconds': wall_seconds, 'schools': results}, f, indent=2, default=str)
+        print(f"Batch report written: {args.report}")
+    # Like cli.py, a non-zero exit flags any school that did not finish cleanly
+    return 0 if all(result['exit_code'] == 0 for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main_batch())
@@ -0,0 +1,75 @@
+"""
+Time the course_preprocessing functions on synthetic enrollment frames of increasing size.
+
+    python benchmarks/bench_course_preprocessing.py --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from course_preprocessing import format_course_data, update_enrollments, format_ids
+
+def make_courses(courses=2000, seed=0):
+    """Courses table as read from courses.csv: float IDs, sparse merge codes and Canvas flags."""
+    rng = np.random.default_rng(seed)
+    course_ids = np.arange(100000, 100000 + courses)
+    merge_codes = np.where(rng.random(courses) < 0.2, rng.choice(course_ids, courses), np.nan)
+    return pd.DataFrame({
+        'MS_COURSE_ID': course_ids.astype(float),
+        'MERGE_CODE': merge_codes,
+        'CANVAS_NEEDED': rng.choice(['Y', 'N'], courses, p=[0.9, 0.1]),
+        'term_id': rng.choice(['2024-S1', '2024-S2', '2024-FY'], courses),
+    })
+
+def make_enrollments(rows, courses_df, seed=0):
+    """Combined student and teacher enrollments with string IDs, as produced by the preprocessors."""
+    rng = np.random.default_rng(seed)
+    course_ids = rng.choice(courses_df['MS_COURSE_ID'].astype(int).astype(str).to_numpy(), rows)
+    user_ids = rng.integers(1, 20000, rows).astype(str)
+    return pd.DataFrame({
+        'course_name': 'Course ' + pd.Series(course_ids),
+        'course_id': course_ids,
+        'subject': 'Subject',
+        'name': 'Surname, Name',
+        'user_id': user_ids,
+        'role': rng.choice(['student', 'teacher'], rows, p=[0.95, 0.05]),
+    })
+
+def best_of(func, make_args, repeat):
+    """Best wall time of func over repeat runs, each on freshly built arguments since the functions mutate them."""
+    times = []
+    for _ in range(repeat):
+        args = make_args()
+        times.append(timeit.timeit(lambda: func(*args), number=1))
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    courses_df = make_courses()
+    formatted_courses, term_map, merge_map = format_course_data(courses_df.copy())
+    course_time = best_of(format_course_data, lambda: (courses_df.copy(),), args.repeat)
+    print(f"format_course_data ({len(courses_df)} courses): {course_time * 1000:.1f} ms")
+
+    print(f"{'rows':>10} {'update_enrollments':>20} {'format_ids':>12}")
+    for rows in args.rows:
+        enrollments_df = make_enrollments(rows, courses_df)
+        update_time = best_of(
+            update_enrollments,
+            lambda: (enrollments_df.copy(), formatted_courses, term_map, merge_map),
+            args.repeat,
+        )
+        updated_df = update_enrollments(enrollments_df.copy(), formatted_courses, term_map, merge_map)
+        format_time = best_of(format_ids, lambda: (updated_df.copy(),), args.repeat)
+        print(f"{rows:>10} {update_time * 1000:>18.1f}ms {format_time * 1000:>10.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Peak memory of eager vs chunked export ingestion as the number of schools grows.
+
+Each measurement runs in a fresh interpreter so ru_maxrss reflects only that run.
+
+    python benchmarks/bench_ingest_memory.py --schools 1 4 16 --chunksize 20000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from synthetic_data import write_school_exports
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure(input_dir, chunksize):
+    """Preprocess the exports in this process and print peak RSS in MiB."""
+    sys.path.insert(0, REPO_ROOT)
+    from student_preprocessing import preprocess_enrollment_data
+    from teacher_preprocessing import melt_teachers
+    from file_handling import load_and_combine_csv, iter_csv_chunks
+
+    students = preprocess_enrollment_data(os.path.join(input_dir, 'student_enroll'), chunksize)
+    teacher_dir = os.path.join(input_dir, 'teacher_enroll')
+    if chunksize:
+        teachers = [melt_teachers(chunk) for chunk in iter_csv_chunks(teacher_dir, chunksize)]
+    else:
+        teachers = [melt_teachers(load_and_combine_csv(teacher_dir))]
+    rows = len(students) + sum(len(df) for df in teachers)
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{rows} {peak_mib:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--schools', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--chunksize', type=int, default=20000)
+    parser.add_argument('--measure', nargs=2, metavar=('INPUT_DIR', 'CHUNKSIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure[0], int(args.measure[1]) or None)
+        return
+
+    print(f"{'schools':>8} {'rows':>10} {'eager MiB':>10} {'chunked MiB':>12}")
+    for schools in args.schools:
+        with tempfile.TemporaryDirectory() as input_dir:
+            os.makedirs(os.path.join(input_dir, 'student_enroll'))
+            os.makedirs(os.path.join(input_dir, 'teacher_enroll'))
+            for school in range(schools):
+                # About 48,000 student enrollment rows per school
+                write_school_exports(input_dir, school, students=8000, courses=400)
+            results = []
+            for chunksize in (0, args.chunksize):
+                output = subprocess.run(
+                    [sys.executable, __file__, '--measure', input_dir, str(chunksize)],
+                    check=True, capture_output=True, text=True,
+                ).stdout.split()
+                results.append(output)
+        print(f"{schools:>8} {results[0][0]:>10} {results[0][1]:>10} {results[1][1]:>12}")
+
+if __name__ == "__main__":
+    main()
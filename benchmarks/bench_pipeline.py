@@ -0,0 +1,174 @@
+"""
+Time the sync pipeline on synthetic districts at 1x, 10x and 100x a typical district.
+
+Results are saved to benchmarks/results/<commit>.json so runs can be compared across commits.
+
+    python benchmarks/bench_pipeline.py --scales 1 10 100
+    python benchmarks/bench_pipeline.py --scales 1 10 --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_ROOT)
+import instrumentation
+import main as pipeline
+import teacher_resolver
+from course_preprocessing import compact_enrollments, format_course_data, update_enrollments, format_ids
+from file_handling import load_csv
+from student_preprocessing import preprocess_enrollment_data
+from teacher_preprocessing import preprocess_teacher_enrollments
+from synthetic_data import generate_district
+
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+def git_label():
+    """Short commit hash of the working tree, marked -dirty when there are uncommitted changes."""
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    return f'{commit}-dirty' if git('status', '--porcelain', '--untracked-files=no') else commit
+
+def best_of(func, make_args, repeat, setup=None):
+    """Best wall time of func over repeat runs on freshly built arguments, and the last result."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        args = make_args()
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def clear_caches():
+    # Parse cache and stage store live under the working directory; name indexes are also kept in memory
+    for directory in ('temp_cache', 'temp_stages', 'temp_outputs'):
+        shutil.rmtree(directory, ignore_errors=True)
+    teacher_resolver._staff.clear()
+    teacher_resolver._name_indexes.clear()
+
+def run_main():
+    """Run main.main non-interactively with no terms selected and no Canvas settings, so nothing is posted."""
+    prompt, load_dotenv = builtins.input, pipeline.load_dotenv
+    builtins.input = lambda *args: ''
+    # Neither a .env file nor exported settings may turn on users, bundles or credentials
+    pipeline.load_dotenv = lambda *args, **kwargs: None
+    settings = {name: os.environ.pop(name) for name in list(os.environ) if name.startswith(('CANVAS_', 'SYNC_'))}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            pipeline.main()
+    finally:
+        builtins.input, pipeline.load_dotenv = prompt, load_dotenv
+        os.environ.update(settings)
+
+def bench_scale(scale, repeat):
+    """Benchmark every pipeline step on one synthetic district; returns the result rows and main.main's stage breakdown."""
+    results = []
+    def record(benchmark, seconds, rows):
+        results.append({'scale': scale, 'benchmark': benchmark, 'rows': rows, 'seconds': round(seconds, 4)})
+        print(f"{scale:>6g}x {benchmark:<32} {rows:>10} rows {seconds * 1000:>10.1f} ms")
+
+    student_dir = os.path.join('temp_inputs', 'student_enroll')
+    teacher_dir = os.path.join('temp_inputs', 'teacher_enroll')
+    teacher_ids_path = os.path.join('temp_inputs', 'teacher_ids.csv')
+
+    seconds, students = best_of(preprocess_enrollment_data, lambda: (student_dir,), repeat)
+    record('preprocess_enrollment_data', seconds, len(students))
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Clear the cached name index so each run also builds it
+        seconds, (teachers, _) = best_of(
+            preprocess_teacher_enrollments, lambda: (teacher_dir, None, None, teacher_ids_path), repeat, clear_caches,
+        )
+    record('preprocess_teacher_enrollments', seconds, len(teachers))
+
+    raw_courses = load_csv(os.path.join('temp_inputs', 'courses.csv'))
+    seconds, (courses, term_map, merge_map) = best_of(format_course_data, lambda: (raw_courses.copy(),), repeat)
+    record('format_course_data', seconds, len(courses))
+    combined = compact_enrollments(pd.concat([students, teachers], ignore_index=True))
+    seconds, updated = best_of(update_enrollments, lambda: (combined.copy(), courses, term_map, merge_map), repeat)
+    record('update_enrollments', seconds, len(combined))
+    seconds, formatted = best_of(format_ids, lambda: (updated.copy(),), repeat)
+    record('format_ids', seconds, len(updated))
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds, _ = best_of(pipeline.apply_overrides, lambda: (formatted.copy(), os.path.join('temp_inputs', 'override.csv')), repeat)
+    record('apply_overrides', seconds, len(formatted))
+
+    seconds, _ = best_of(run_main, lambda: (), repeat, clear_caches)
+    record('main (cold cache)', seconds, len(formatted))
+    instrumentation.reset()
+    seconds, _ = best_of(run_main, lambda: (), 1)
+    record('main (warm cache)', seconds, len(formatted))
+
+    stages = {}
+    for stage in instrumentation.records():
+        stages[stage['stage']] = round(stages.get(stage['stage'], 0) + stage['wall_seconds'], 4)
+    return results, stages
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(row['scale'], row['benchmark']): row['seconds'] for row in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'scale':>6} {'benchmark':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for row in results:
+        before = baseline.get((row['scale'], row['benchmark']))
+        if before:
+            change = f"{(row['seconds'] / before - 1) * 100:+.0f}%"
+            print(f"{row['scale']:>5g}x {row['benchmark']:<32} {before:>9.3f}s {row['seconds']:>9.3f}s {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--label', default=None, help="name for the results file (default: the current commit)")
+    parser.add_argument('--compare', metavar='RESULTS_JSON', help="print the change against an earlier results file")
+    args = parser.parse_args()
+
+    results = []
+    main_stages = {}
+    working_dir = os.getcwd()
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as district:
+            generate_district(os.path.join(district, 'temp_inputs'), scale)
+            os.chdir(district)
+            try:
+                scale_results, main_stages[f'{scale:g}'] = bench_scale(scale, args.repeat)
+            finally:
+                os.chdir(working_dir)
+            results.extend(scale_results)
+
+    label = args.label or git_label()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results_path = os.path.join(RESULTS_DIR, f'{label}.json')
+    with open(results_path, 'w') as f:
+        json.dump({
+            'label': label,
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat,
+            'results': results,
+            'main_stages': main_stages,
+        }, f, indent=2)
+    print(f"Results written to {results_path}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Generate synthetic MySchool exports in the temp_inputs layout, at a multiple of a typical district.
+
+    python benchmarks/synthetic_data.py /tmp/district --scale 10
+
+Writes student_enroll/ and teacher_enroll/ exports per school, teacher_ids.csv, courses.csv,
+override.csv and add_to_all.csv. Output is deterministic for a given scale and seed.
+"""
+import argparse
+import csv
+import os
+import random
+
+# A typical district at scale 1: four schools of 600 students, each student taking six courses
+SCHOOLS = 4
+STUDENTS_PER_SCHOOL = 600
+COURSES_PER_SCHOOL = 150
+COURSES_PER_STUDENT = 6
+TEACHERS_PER_SCHOOL = 40
+TERMS = ['2024-S1', '2024-S2', '2024-FY']
+
+SURNAMES = [
+    'Smith', 'Nguyen', 'Williams', 'Brown', 'Jones', 'García', 'Taylor', 'Wilson', 'Martin', "O'Brien",
+    'Anderson', 'Thompson', 'Lee', 'White', 'Kowalski', 'Harris', 'Ryan', 'Walker', 'Singh', 'Zhang',
+    'Müller', 'Kelly', 'King', 'Davies', 'Robinson', 'Wright', 'Campbell', 'Hall', 'Young', 'Allen',
+]
+GIVEN_NAMES = [
+    'Olivia', 'Jack', 'Amelia', 'Noah', 'Isla', 'Leo', 'Mia', 'Henry', 'Ava', 'Oliver',
+    'Chloé', 'Lucas', 'Grace', 'Thomas', 'Zoe', 'William', 'Ruby', 'James', 'Ella', 'Mohammed',
+]
+SUBJECTS = ['English', 'Mathematics', 'Science', 'History', 'Geography', 'Art', 'Music', 'PE', 'French', 'Drama']
+
+def course_id(school, course):
+    return 100000 + school * 1000 + course
+
+def teacher_user_id(school, teacher):
+    # Staff IDs sit above every student ID, even at 100 times the district size
+    return 9000000 + school * 1000 + teacher
+
+def student_user_id(school, student):
+    return school * 10000 + student + 1
+
+def _person(rng):
+    return rng.choice(SURNAMES), rng.choice(GIVEN_NAMES)
+
+def staff_names(count, seed=0):
+    """Distinct staff names, so that every name in teacher_ids.csv resolves to one person; double-barrelled surnames extend the pool."""
+    surnames = SURNAMES + [f"{first}-{second}" for first in SURNAMES for second in SURNAMES if first != second]
+    pool = [(surname, name) for surname in surnames for name in GIVEN_NAMES]
+    if count > len(pool):
+        raise ValueError(f"At most {len(pool)} distinct staff names are available")
+    # Shuffle within each tier so single surnames are used first
+    single = len(SURNAMES) * len(GIVEN_NAMES)
+    rng = random.Random(f'{seed}-staff')
+    head, tail = pool[:single], pool[single:]
+    rng.shuffle(head)
+    rng.shuffle(tail)
+    return (head + tail)[:count]
+
+def _export_name(surname, name, rng):
+    """Teacher name as typed into a class record: mostly exact, sometimes recased, unaccented, spaced oddly or misspelt."""
+    roll = rng.random()
+    if roll < 0.03:
+        return f"{surname.upper()}, {name}"
+    if roll < 0.05:
+        return f"{surname.replace('ü', 'u').replace('í', 'i')},  {name.replace('é', 'e')}"
+    if roll < 0.06 and len(surname) > 4:
+        i = rng.randrange(1, len(surname) - 1)
+        return f"{surname[:i]}{surname[i + 1]}{surname[i]}{surname[i + 2:]}, {name}"
+    return f"{surname}, {name}"
+
+def write_school_exports(directory, school, students=STUDENTS_PER_SCHOOL, courses=COURSES_PER_SCHOOL, teachers=TEACHERS_PER_SCHOOL, names=None, seed=0):
+    """
+    Write one school's student list and split-teacher exports.
+
+    Returns:
+        list: (surname, name, user ID) for each of the school's teachers, named from names when given.
+    """
+    rng = random.Random(f'{seed}-{school}')
+    names = names or [_person(rng) for _ in range(teachers)]
+    staff = [(*names[teacher], teacher_user_id(school, teacher)) for teacher in range(teachers)]
+    # Each student keeps one name across all of their courses
+    pupils = [_person(rng) for _ in range(students)]
+    roster = {course: [] for course in range(courses)}
+    for student in range(students):
+        for course in rng.sample(range(courses), min(COURSES_PER_STUDENT, courses)):
+            roster[course].append((student, *pupils[student]))
+
+    student_path = os.path.join(directory, 'student_enroll', f'school_{school}.csv')
+    teacher_path = os.path.join(directory, 'teacher_enroll', f'school_{school}.csv')
+    with open(student_path, 'w', newline='', encoding='utf-8') as student_file, open(teacher_path, 'w', newline='', encoding='utf-8') as teacher_file:
+        student_rows = csv.writer(student_file)
+        teacher_rows = csv.writer(teacher_file)
+        student_rows.writerow(['course_name', 'course_id', 'subject', 'name', '', 'student_id'])
+        # The trailing blank column mirrors the extra comma MySchool leaves on split-teacher exports
+        teacher_rows.writerow(['course_name', 'course_id', 'subject', 'teacher', 'teacher_2', 'teacher_3', ''])
+        for course, enrolled in roster.items():
+            subject = SUBJECTS[course % len(SUBJECTS)]
+            course_name = f"{subject} {7 + course % 6}{chr(65 + course % 5)}"
+            # Course header row, then one row per student under it
+            student_rows.writerow([course_name, course_id(school, course), subject, '', '', ''])
+            for student, surname, name in enrolled:
+                student_rows.writerow(['', '', '', f"{surname}, {name}", '', student_user_id(school, student)])
+            if rng.random() < 0.1:
+                student_rows.writerow(['', '', '', '', '', ''])
+
+            teaching = [staff[course % teachers]]
+            if rng.random() < 0.2:
+                teaching.append(rng.choice(staff))
+            teacher_names = [_export_name(surname, name, rng) for surname, name, _ in teaching]
+            if rng.random() < 0.01:
+                # Relief staff missing from the staff export end up in the unresolved report
+                teacher_names.append(f"{rng.choice(SURNAMES)}-Relief, {rng.choice(GIVEN_NAMES)}")
+            teacher_rows.writerow([course_name, course_id(school, course), subject] + (teacher_names + ['', '', ''])[:3] + [''])
+    return staff
+
+def write_teacher_ids(directory, staff):
+    with open(os.path.join(directory, 'teacher_ids.csv'), 'w', newline='', encoding='utf-8') as f:
+        rows = csv.writer(f)
+        rows.writerow(['SURNAME', 'NAME', 'USER ID'])
+        rows.writerows(staff)
+
+def write_courses(directory, schools, courses=COURSES_PER_SCHOOL, seed=0):
+    """Write courses.csv: roughly 10% of courses merged into another course of the school, 5% not needed on Canvas."""
+    rng = random.Random(f'{seed}-courses')
+    with open(os.path.join(directory, 'courses.csv'), 'w', newline='', encoding='utf-8') as f:
+        rows = csv.writer(f)
+        rows.writerow([
+            'COURSE_LABEL', 'MS_COURSE_ID', 'SCHOOL_LEVEL', 'TRAX', 'MERGE_CODE', 'CANVAS_NEEDED', 'TWO_YEAR_FLAG', 'term_id',
+            'blueprint_course_id', 'name_override', 'code_override', 'long_name', 'short_name', 'status', 'course_id', 'account_id',
+        ])
+        for school in range(schools):
+            for course in range(courses):
+                ms_course_id = course_id(school, course)
+                subject = SUBJECTS[course % len(SUBJECTS)]
+                merge_code = course_id(school, rng.randrange(courses)) if rng.random() < 0.1 else ''
+                rows.writerow([
+                    f"{subject.upper()[:4]}{course:03d}", ms_course_id, 'SS' if school % 2 else 'MS', '', merge_code,
+                    'N' if rng.random() < 0.05 else 'Y', 'Y' if course % 20 == 0 else '', TERMS[course % len(TERMS)],
+                    f"bp_{subject.lower()}" if course % 3 == 0 else '', '', '', f"{subject} {course} ({school})",
+                    f"{subject[:4]}{course}-{school}", 'active', f"c{ms_course_id:06d}", school + 1,
+                ])
+
+def write_overrides(directory, schools, courses=COURSES_PER_SCHOOL, rows_per_school=20, seed=0):
+    """Write override.csv with formatted IDs (teacher aides and extra students) and add_to_all.csv with district staff."""
+    rng = random.Random(f'{seed}-overrides')
+    with open(os.path.join(directory, 'override.csv'), 'w', newline='', encoding='utf-8') as f:
+        rows = csv.writer(f)
+        rows.writerow(['course_name', 'course_id', 'subject', 'name', 'user_id', 'type', 'role', 'status', 'term_id'])
+        for school in range(schools):
+            for _ in range(rows_per_school):
+                course = rng.randrange(courses)
+                surname, name = _person(rng)
+                user_id = student_user_id(school, rng.randrange(STUDENTS_PER_SCHOOL))
+                rows.writerow([
+                    f"Override {course}", f"c{course_id(school, course):06d}", SUBJECTS[course % len(SUBJECTS)],
+                    f"{surname}, {name}", f"u{user_id:06d}", '', rng.choice(['ta', 'student']), 'active', TERMS[course % len(TERMS)],
+                ])
+    with open(os.path.join(directory, 'add_to_all.csv'), 'w', newline='', encoding='utf-8') as f:
+        rows = csv.writer(f)
+        rows.writerow(['user_id', 'name', 'role'])
+        rows.writerow(['u999001', 'Learning Support', 'teacher'])
+        rows.writerow(['u999002', 'Head of Curriculum', 'ta'])
+
+def generate_district(directory, scale=1, seed=0):
+    """
+    Write a synthetic district of SCHOOLS * scale schools into directory, laid out like temp_inputs.
+
+    Returns:
+        dict: Number of schools, courses and student enrollments written.
+    """
+    schools = max(1, round(SCHOOLS * scale))
+    os.makedirs(os.path.join(directory, 'student_enroll'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'teacher_enroll'), exist_ok=True)
+    names = staff_names(schools * TEACHERS_PER_SCHOOL, seed)
+    staff = []
+    for school in range(schools):
+        school_names = names[school * TEACHERS_PER_SCHOOL:(school + 1) * TEACHERS_PER_SCHOOL]
+        staff.extend(write_school_exports(directory, school, names=school_names, seed=seed))
+    write_teacher_ids(directory, staff)
+    write_courses(directory, schools, seed=seed)
+    write_overrides(directory, schools, seed=seed)
+    return {
+        'schools': schools,
+        'courses': schools * COURSES_PER_SCHOOL,
+        'student_enrollments': schools * STUDENTS_PER_SCHOOL * COURSES_PER_STUDENT,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('directory', help="directory to write the exports to, e.g. temp_inputs")
+    parser.add_argument('--scale', type=float, default=1, help="multiple of a typical district (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    summary = generate_district(args.directory, args.scale, args.seed)
+    print(f"Wrote {summary['schools']} schools, {summary['courses']} courses and {summary['student_enrollments']} student enrollments to {args.directory}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Non-interactive command-line entry point for scheduled syncs.
+
+Stages run in pipeline order and pick up the tables stored by earlier runs when an
+earlier stage is skipped. Pipeline modules (and pandas) are only imported by the
+stages that need them, so --help and runs with nothing to do return immediately.
+
+    python cli.py --all-terms --incremental
+    python cli.py --stages parse transform
+    python cli.py --stages write post --terms 2024-S1 2024-FY --dry-run
+    python cli.py --all-terms --dry-run --report temp_outputs/run_report.json --profile temp_outputs/run.prof
+"""
+import argparse
+import os
+import sys
+from contextlib import nullcontext
+import instrumentation
+
+STAGES = ['parse', 'transform', 'write', 'post']
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0], epilog="Canvas credentials are read from CANVAS_API_TOKEN, CANVAS_URL and CANVAS_ACCOUNT_ID (or a .env file).")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help="stages to run (default: all)")
+    terms = parser.add_mutually_exclusive_group()
+    terms.add_argument('--terms', nargs='+', default=[], metavar='TERM', help="term IDs to post to Canvas")
+    terms.add_argument('--all-terms', action='store_true', help="post every term")
+    parser.add_argument('--dry-run', action='store_true', help="write files but post nothing to Canvas")
+    parser.add_argument('--input-root', default='temp_inputs', help="directory holding the MySchool exports (default: %(default)s)")
+    parser.add_argument('--output-root', default='temp_outputs', help="directory for Canvas CSVs and snapshots (default: %(default)s)")
+    parser.add_argument('--teacher-ids', metavar='PATH', help="staff export to resolve teachers against (default: teacher_ids.csv in --input-root)")
+    parser.add_argument('--retire-missing-courses', action='store_true', help="treat courses.csv as a full export and retire catalogue courses missing from it")
+    parser.add_argument('--stage-dir', default='temp_stages', help="directory for tables passed between stages (default: %(default)s)")
+    parser.add_argument('--cache-dir', default='temp_cache', help="directory for the parse cache, reused while the exports are unchanged (default: %(default)s)")
+    parser.add_argument('--workers', type=int, help="parse export files in this many processes")
+    parser.add_argument('--chunksize', type=int, help="stream export files in chunks of this many rows")
+    parser.add_argument('--incremental', action='store_true', help="post only the changes since the last successful post")
+    parser.add_argument('--bundle', action='store_true', help="post courses and enrollments as one zipped SIS import")
+    parser.add_argument('--users', action='store_true', help="also post users that are new or changed since the last successful post")
+    parser.add_argument('--login-id', metavar='FORMAT', help="login ID of each posted user, e.g. '{number}@school.example'; fields: user_id, number, first_name, last_name")
+    parser.add_argument('--upload-concurrency', type=int, default=4, help="maximum SIS imports in flight (default: %(default)s)")
+    parser.add_argument('--report', metavar='PATH', help="write per-stage timings, memory and row counts to this JSON file")
+    parser.add_argument('--profile', metavar='PATH', help="profile the run with cProfile and dump the stats to this file")
+    parser.add_argument('--trace-memory', action='store_true', help="add tracemalloc allocation peaks to the report (slower)")
+    return parser
+
+def select_terms(args, available_terms):
+    """Pick the requested terms out of the available ones, warning about any that do not exist."""
+    if args.all_terms:
+        return list(available_terms)
+    available = {str(term): term for term in available_terms}
+    for term in args.terms:
+        if term not in available:
+            print(f"Warning: term {term} has no enrollments. Skipping.")
+    return [available[term] for term in args.terms if term in available]
+
+def written_terms(output_root):
+    """Terms with an enrollments.csv written by an earlier write stage."""
+    if not os.path.isdir(output_root):
+        return []
+    prefix = 'enrollments_'
+    return sorted(
+        name[len(prefix):] for name in os.listdir(output_root)
+        if name.startswith(prefix) and os.path.exists(os.path.join(output_root, name, 'enrollments.csv'))
+    )
+
+def run(args):
+    """Run the selected stages, profiled and reported as requested; returns the process exit code."""
+    if args.trace_memory:
+        instrumentation.start_memory_tracing()
+    with instrumentation.profile(args.profile) if args.profile else nullcontext():
+        exit_code = run_stages(args)
+    if args.report:
+        instrumentation.write_report(args.report, selected_stages=args.stages, exit_code=exit_code)
+        print(f"Run report written: {args.report}")
+    return exit_code
+
+def check_login_id(login_id_format):
+    """Error message for a --login-id format that cannot be filled in, or None."""
+    if not login_id_format:
+        return "--users needs --login-id to build each user's login ID."
+    try:
+        login_id_format.format(user_id='u000001', number=1, first_name='', last_name='')
+    except (KeyError, IndexError, ValueError) as e:
+        return f"--login-id {login_id_format!r} cannot be filled in: {type(e).__name__}: {e}"
+    return None
+
+def run_stages(args):
+    """Run the selected stages; returns the process exit code."""
+    parsed = full_enrollment_df = courses_df = uploads = user_upload = None
+    error = check_login_id(args.login_id) if args.users else None
+    if error:
+        print(f"Error: {error}")
+        return 2
+
+    if 'parse' in args.stages:
+        import main
+        parsed = main.parse_stage(args.chunksize, args.workers, args.input_root, args.output_root, args.stage_dir, args.teacher_ids, args.retire_missing_courses, args.cache_dir)
+
+    if 'transform' in args.stages:
+        import main
+        if parsed is None:
+            parsed = tuple(main.load_stage(name, args.stage_dir) for name in ('students', 'teachers', 'courses'))
+        full_enrollment_df, courses_df = main.transform_stage(*parsed, args.input_root, args.stage_dir, args.output_root, args.cache_dir)
+
+    if 'write' in args.stages:
+        import main
+        if full_enrollment_df is None:
+            full_enrollment_df, courses_df = main.load_stage('enrollments', args.stage_dir), main.load_stage('courses', args.stage_dir)
+        available_terms = main.list_terms(full_enrollment_df, args.incremental, args.output_root)
+        uploads = main.save_enrollments_by_term(full_enrollment_df, select_terms(args, available_terms), args.incremental, output_root=args.output_root)
+        # Courses are only posted in bundles, so only bundles have a course snapshot to diff against
+        previous_courses = main.load_course_snapshot(os.path.join(args.output_root, 'snapshots')) if args.incremental and args.bundle else None
+        main.update_and_save_courses(courses_df, os.path.join(args.output_root, 'courses.csv'), previous_courses)
+        if args.users:
+            user_upload = main.write_users(main.load_stage('users', args.stage_dir), args.login_id, args.output_root)
+
+    if 'post' in args.stages:
+        if uploads is None:
+            selected_terms = select_terms(args, written_terms(args.output_root))
+            # Checked before the pipeline is imported, so runs with nothing to post return immediately
+            users_written = args.users and os.path.exists(os.path.join(args.output_root, 'users_delta.csv'))
+            if not selected_terms and not users_written:
+                print("No terms selected. Nothing to post.")
+                return 0
+            import main
+            from user_sync import collect_user_upload
+            uploads = main.collect_uploads(selected_terms, args.incremental, args.output_root)
+            user_upload = collect_user_upload(args.output_root) if args.users else None
+        # A bundle can still carry course changes when no enrollments changed
+        if not uploads and user_upload is None and not args.bundle:
+            print("No user or enrollment changes to post.")
+            return 0
+        if args.dry_run:
+            if user_upload is not None:
+                print(f"Dry run: would post {user_upload[0]} ({len(user_upload[1])} users)")
+            for term, (upload_path, upload_df, _) in uploads.items():
+                print(f"Dry run: would post {upload_path} ({len(upload_df)} rows) for term {term}")
+            return 0
+        return post(args, uploads, courses_df, user_upload)
+    return 0
+
+def post(args, uploads, courses_df, user_upload=None):
+    import main
+    main.load_dotenv()
+    token = os.getenv('CANVAS_API_TOKEN')
+    canvas_url = os.getenv('CANVAS_URL')
+    account_id = os.getenv('CANVAS_ACCOUNT_ID')
+    if not (token and canvas_url and account_id):
+        print("Error: CANVAS_API_TOKEN, CANVAS_URL and CANVAS_ACCOUNT_ID must be set to post.")
+        return 2
+
+    if args.bundle:
+        if courses_df is None:
+            courses_df = main.load_stage('courses', args.stage_dir)
+        sis_import = main.post_sis_bundle(uploads, courses_df, token, canvas_url, account_id, args.incremental, args.output_root, user_upload)
+        states = [sis_import] if sis_import is not None else []
+    else:
+        # Users are imported first so that enrollments for new users find them
+        states = [main.post_users(user_upload, token, canvas_url, account_id, args.output_root)] if user_upload is not None else []
+        if uploads:
+            results = main.post_enrollments_by_term(uploads, token, canvas_url, account_id, args.incremental, args.upload_concurrency, args.output_root)
+            states += list(results.values())
+    # A non-zero exit lets the scheduler flag imports that did not finish cleanly
+    return 0 if all(sis_import.get('workflow_state') in main.SUCCESS_STATES for sis_import in states) else 1
+
+if __name__ == "__main__":
+    sys.exit(run(build_parser().parse_args()))
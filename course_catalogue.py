@@ -0,0 +1,81 @@
+import pandas as pd
+import os
+from course_preprocessing import format_course_data, plain_ids
+from file_handling import load_cached, read_export, CACHE_DIR
+from incremental_sync import write_parquet_atomic
+
+CATALOGUE_PATH = 'temp_outputs/course_catalogue.parquet'
+# Columns that come from the MySchool course export
+EXPORT_COLUMNS = ['COURSE_LABEL', 'MS_COURSE_ID', 'SCHOOL_LEVEL', 'TRAX']
+# Columns filled in by hand; blanks in a fresh export never overwrite them, CLEAR_VALUE empties them
+MANUAL_COLUMNS = [
+    'MERGE_CODE', 'CANVAS_NEEDED', 'TWO_YEAR_FLAG', 'term_id', 'blueprint_course_id', 'name_override',
+    'code_override', 'long_name', 'short_name', 'status', 'course_id', 'account_id',
+]
+CLEAR_VALUE = '-'
+
+def load_catalogue(catalogue_path=CATALOGUE_PATH):
+    """Load the course catalogue, or an empty one if none has been built yet."""
+    if not os.path.exists(catalogue_path):
+        return pd.DataFrame(columns=EXPORT_COLUMNS + MANUAL_COLUMNS, dtype=object)
+    catalogue_df = pd.read_parquet(catalogue_path).astype(object)
+    return catalogue_df.where(catalogue_df.notna(), float('nan'))
+
+def save_catalogue(catalogue_df, catalogue_path=CATALOGUE_PATH):
+    write_parquet_atomic(catalogue_df.astype('string'), catalogue_path)
+
+def merge_course_export(catalogue_df, export_df, retire_missing=False):
+    """
+    Merge a course export into the catalogue, keyed on MS_COURSE_ID.
+
+    Export columns are taken from the export for every course it lists. Manual columns
+    (merge codes, terms, blueprints, names, ...) keep their catalogue values unless the export
+    fills them in, so a plain MySchool export can be swapped in without losing the setup.
+    A manual cell set to CLEAR_VALUE empties the catalogue value.
+    Courses missing from the export stay in the catalogue; with retire_missing, the export is
+    taken to list every current course and the missing ones are set to CANVAS_NEEDED=N.
+
+    Returns:
+        pd.DataFrame: The merged catalogue, catalogue courses first and new courses after.
+    """
+    export_df = export_df.copy()
+    export_df['MS_COURSE_ID'] = plain_ids(export_df['MS_COURSE_ID'])
+    if 'MERGE_CODE' in export_df.columns:
+        export_df['MERGE_CODE'] = plain_ids(export_df['MERGE_CODE'])
+    export = export_df.dropna(subset=['MS_COURSE_ID']).drop_duplicates('MS_COURSE_ID', keep='last').set_index('MS_COURSE_ID')
+    catalogue = catalogue_df.set_index('MS_COURSE_ID')
+
+    columns = list(dict.fromkeys([*catalogue.columns, *export.columns]))
+    merged = catalogue.reindex(index=catalogue.index.append(export.index.difference(catalogue.index, sort=False)), columns=columns)
+    export_columns = [column for column in export.columns if column not in MANUAL_COLUMNS]
+    manual_columns = [column for column in export.columns if column in MANUAL_COLUMNS]
+    merged.loc[export.index, export_columns] = export[export_columns]
+    merged.update(export[manual_columns])
+    cleared = export[manual_columns] == CLEAR_VALUE
+    for column in manual_columns:
+        merged.loc[cleared.index[cleared[column]], column] = float('nan')
+
+    new_courses = len(merged) - len(catalogue)
+    missing_courses = catalogue.index.difference(export.index, sort=False)
+    if new_courses:
+        print(f"{new_courses} new courses added to the course catalogue")
+    if retire_missing and len(missing_courses):
+        merged.loc[missing_courses, 'CANVAS_NEEDED'] = 'N'
+        print(f"{len(missing_courses)} catalogue courses are not in the latest export and were retired")
+    elif len(missing_courses):
+        print(f"{len(missing_courses)} catalogue courses are not in the latest export and were kept")
+    return merged.reset_index()
+
+def update_catalogue(courses_path, catalogue_path=CATALOGUE_PATH, retire_missing=False):
+    """Merge courses.csv into the persistent course catalogue and return the catalogue."""
+    catalogue_df = merge_course_export(load_catalogue(catalogue_path), read_export(courses_path), retire_missing)
+    save_catalogue(catalogue_df, catalogue_path)
+    return catalogue_df
+
+def build_course_maps(catalogue_path):
+    _, term_map, merge_map = format_course_data(load_catalogue(catalogue_path))
+    return term_map, merge_map
+
+def load_course_maps(catalogue_path=CATALOGUE_PATH, cache_dir=CACHE_DIR):
+    """Term and merge lookups keyed on MS_COURSE_ID, rebuilt only when the catalogue changes."""
+    return load_cached('course_maps', [catalogue_path], build_course_maps, catalogue_path, cache_dir=cache_dir)
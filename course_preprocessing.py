@@ -1,36 +1,121 @@
+import numpy as np
 import pandas as pd
+import os
+from instrumentation import instrumented
+from incremental_sync import diff_courses
 
+# Enrollment columns with few distinct values relative to the number of rows
+COMPACT_COLUMNS = ['course_name', 'course_id', 'subject', 'name', 'user_id', 'role', 'type', 'status', 'term_id']
+
+@instrumented('compact_enrollments')
+def compact_enrollments(full_enrollment_df):
+    """
+    Store the repetitive enrollment columns as categoricals: one copy of each distinct value plus integer codes.
+    Mapping and formatting then touch only the distinct values, and isin, drop_duplicates and
+    per-term filters compare integer codes instead of Python strings.
+    """
+    columns = [column for column in COMPACT_COLUMNS if column in full_enrollment_df.columns]
+    return full_enrollment_df.astype({column: 'category' for column in columns})
+
+def append_enrollments(full_enrollment_df, rows):
+    """
+    Append enrollment rows, extending the categories of compact columns with any new values.
+    Concatenating plain rows onto categoricals would convert every row of those columns back to strings.
+    """
+    rows = rows.reindex(columns=full_enrollment_df.columns)
+    extended = {}
+    for column in full_enrollment_df.columns:
+        dtype = full_enrollment_df[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            new_values = pd.Index(rows[column].dropna().unique()).difference(dtype.categories)
+            if len(new_values):
+                # Existing codes stay valid when categories are appended, so rebuild from them rather than re-encoding
+                dtype = pd.CategoricalDtype(dtype.categories.append(new_values))
+                codes = full_enrollment_df[column].cat.codes.to_numpy()
+                extended[column] = pd.Series(pd.Categorical.from_codes(codes, dtype=dtype, validate=False), index=full_enrollment_df.index)
+            rows[column] = pd.Categorical(rows[column], dtype=dtype)
+    return pd.concat([full_enrollment_df.assign(**extended), rows], ignore_index=True)
+
+def _transform_unique(values, transform):
+    """
+    Apply a vectorized transform to each distinct value once and broadcast the result back to every row.
+    IDs repeat across many enrollments, so this is far cheaper than transforming the full column. Blanks are kept.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Transform the categories and remap the integer codes, keeping the column categorical
+        transformed = transform(pd.Series(values.cat.categories, dtype=object))
+        new_codes, new_categories = pd.factorize(transformed)
+        codes = values.cat.codes.to_numpy()
+        codes = np.where(codes >= 0, np.append(new_codes, -1).take(codes), -1)
+        return pd.Series(pd.Categorical.from_codes(codes, new_categories), index=values.index)
+
+    codes, uniques = pd.factorize(values)
+    transformed = transform(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    # The trailing placeholder keeps take() valid for blank rows (code -1), which fall back to their own value
+    transformed = np.append(transformed, None).take(codes)
+    return pd.Series(np.where(codes >= 0, transformed, values.to_numpy(dtype=object)), index=values.index)
+
+def plain_ids(values):
+    """
+    Render numeric IDs as plain integers, without leading zeros or the decimals pandas adds to numeric
+    columns with blanks, so "0100", "100" and 100.0 all become "100". Values that are not numbers are kept as is.
+    """
+    def render(unique_ids):
+        ids = pd.to_numeric(unique_ids, errors='coerce').astype('Int64')
+        return ids.astype(str).where(ids.notna(), unique_ids)
+    return _transform_unique(values, render)
+
+def prefixed_ids(values, prefix):
+    """Format numeric IDs as prefix + zero-padded 6 digits; values that are not numbers are kept as is."""
+    def render(unique_ids):
+        ids = pd.to_numeric(unique_ids, errors='coerce').astype('Int64')
+        return (prefix + ids.astype(str).str.zfill(6)).where(ids.notna(), unique_ids)
+    return _transform_unique(values, render)
+
+@instrumented('format_course_data')
 def format_course_data(courses_df):
-    courses_df['MS_COURSE_ID'] = courses_df['MS_COURSE_ID'].apply(lambda x: str(int(x)) if pd.notna(x) else x)
-    courses_df['MERGE_CODE'] = courses_df['MERGE_CODE'].apply(lambda x: str(int(x)) if pd.notna(x) else x)
-    term_map = courses_df.set_index('MS_COURSE_ID')['term_id'].to_dict()
-    merge_map = courses_df.set_index('MS_COURSE_ID')['MERGE_CODE'].dropna().to_dict()
+    courses_df['MS_COURSE_ID'] = plain_ids(courses_df['MS_COURSE_ID'])
+    courses_df['MERGE_CODE'] = plain_ids(courses_df['MERGE_CODE'])
+    course_index = courses_df.set_index('MS_COURSE_ID')
+    term_map = course_index['term_id'].to_dict()
+    merge_map = course_index['MERGE_CODE'].dropna().to_dict()
     return courses_df, term_map, merge_map
 
+@instrumented('update_enrollments')
 def update_enrollments(full_enrollment_df, courses_df, term_map, merge_map):
-    full_enrollment_df['term_id'] = full_enrollment_df['course_id'].apply(lambda x: term_map.get(x))
-    full_enrollment_df['course_id'] = full_enrollment_df['course_id'].apply(lambda x: merge_map.get(x, x))
+    course_ids = full_enrollment_df['course_id']
+    full_enrollment_df['term_id'] = _transform_unique(course_ids, lambda ids: ids.map(term_map))
+    full_enrollment_df['course_id'] = _transform_unique(course_ids, lambda ids: ids.map(merge_map).fillna(ids))
     remove_courses = courses_df[courses_df['CANVAS_NEEDED'] == 'N']['MS_COURSE_ID']
     full_enrollment_df = full_enrollment_df[~full_enrollment_df['course_id'].isin(remove_courses)]
     return full_enrollment_df
 
+@instrumented('format_ids')
 def format_ids(full_enrollment_df):
-    def format_user_id(user_id):
-        if pd.notna(user_id) and str(user_id).lower() != 'nan':
-            return f'u{int(user_id):06}'
-        else:
-            return user_id
-
-    def format_course_id(course_id):
-        return f'c{int(course_id):06}' if pd.notna(course_id) else course_id
-
-    full_enrollment_df['user_id'] = full_enrollment_df['user_id'].apply(format_user_id)
-    full_enrollment_df['course_id'] = full_enrollment_df['course_id'].apply(format_course_id)
-    full_enrollment_df['status'] = 'active'
+    # Blank and literal "nan" user IDs are left untouched rather than formatted
+    full_enrollment_df['user_id'] = prefixed_ids(full_enrollment_df['user_id'], 'u')
+    full_enrollment_df['course_id'] = prefixed_ids(full_enrollment_df['course_id'], 'c')
+    full_enrollment_df['status'] = pd.Series('active', index=full_enrollment_df.index, dtype='category')
     return full_enrollment_df
 
-def update_and_save_courses(courses_df):
+def select_canvas_courses(courses_df):
     courses_df = courses_df[courses_df['CANVAS_NEEDED'] == 'Y']
     selected_columns = ['long_name', 'short_name', 'status', 'course_id', 'account_id', 'term_id', 'blueprint_course_id']
-    courses_df = courses_df[selected_columns]
-    courses_df.to_csv('temp_outputs/courses.csv', index=False)
\ No newline at end of file
+    return courses_df[selected_columns]
+
+def update_and_save_courses(courses_df, file_path='temp_outputs/courses.csv', previous_df=None):
+    """
+    Write courses.csv for Canvas. Given the last posted course rows, also write courses_delta.csv
+    with only the new or changed courses. Returns the course rows to post.
+    """
+    courses_df = select_canvas_courses(courses_df)
+    courses_df.to_csv(file_path, index=False)
+    delta_path = os.path.join(os.path.dirname(file_path), 'courses_delta.csv')
+    if previous_df is None:
+        # A delta left by an earlier run would no longer match the last post
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
+        return courses_df
+    delta_df = diff_courses(courses_df, previous_df)
+    delta_df.to_csv(delta_path, index=False)
+    return delta_df
\ No newline at end of file
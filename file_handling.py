@@ -1,19 +1,267 @@
+import numpy as np
 import pandas as pd
+import csv
 import glob
+import hashlib
+import io
+import itertools
 import os
+import pickle
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import measure
+
+STAGE_DIR = 'temp_stages'
+CACHE_DIR = 'temp_cache'
+# Modules whose code decides what the parse cache holds; editing any of them invalidates every entry
+CACHED_SOURCES = ['student_preprocessing.py', 'teacher_preprocessing.py', 'teacher_resolver.py', 'course_preprocessing.py', 'course_catalogue.py', 'file_handling.py']
+CACHE_MAX_AGE = 30 * 24 * 60 * 60
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Export cells are kept as strings and only empty cells are missing, so IDs are never read as floats.
+# index_col=False stops a trailing comma on every row from turning the first column into the index.
+EXPORT_OPTIONS = {'dtype': object, 'keep_default_na': False, 'na_values': [''], 'encoding': 'utf-8-sig', 'index_col': False}
+# os.umask can only be read by setting it, so it is read once here rather than from the writer threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _source_version(source_names):
+    """Hash of the pandas version and the given source files, so stale cache entries are never served."""
+    digest = hashlib.sha256(pd.__version__.encode())
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in source_names:
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+CACHE_VERSION = _source_version(CACHED_SOURCES)
+
+def list_csv_files(directory):
+    """List the CSV files in the specified directory in a stable, sorted order."""
+    pattern = os.path.join(directory, '*.csv')
+    return sorted(glob.glob(pattern))
+
+def _export_columns(header, width):
+    """Column names for width columns, naming blank and repeated headers the way read_csv does."""
+    names, seen = [], {}
+    for position in range(width):
+        name = (header[position] if position < len(header) else '') or f'Unnamed: {position}'
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(f'{name}.{count}' if count else name)
+    return names
+
+def _tokenize_export(file_path, chunksize=None):
+    """
+    Tokenize an export with the csv module, padding every row to the widest row in its chunk.
+    Cells beyond the header go into "Unnamed: i" columns instead of failing the read.
+    """
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = filter(None, reader)  # Blank lines are skipped, as read_csv does
+        while chunk := list(itertools.islice(rows, chunksize)):
+            lengths = set(map(len, chunk))
+            width = max(len(header), *lengths)
+            if lengths != {width}:
+                chunk = [row + [''] * (width - len(row)) for row in chunk]
+            values = np.array(chunk, dtype=object)
+            values[values == ''] = np.nan
+            yield pd.DataFrame(values, columns=_export_columns(header, width), dtype=object)
+
+def _export_width(file_path):
+    """The header and the number of cells in the header or the first data row, whichever is wider."""
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        return header, max(len(header), len(next(filter(None, reader), [])))
+
+def read_export(file_path):
+    """
+    Read a MySchool export with every cell as a string and blank cells as missing.
+    Handles byte order marks, and rows with more cells than the header are kept rather than rejected.
+    """
+    header, width = _export_width(file_path)
+    # MySchool usually ends every row with a comma; naming the extra column keeps read_csv from
+    # silently dropping those cells, so the common shape still gets the C tokenizer
+    names = {'header': 0, 'names': _export_columns(header, width)} if width > len(header) else {}
+    try:
+        return pd.read_csv(file_path, **EXPORT_OPTIONS, **names)
+    except pd.errors.ParserError:
+        # Only rows wider than the first stop the C tokenizer
+        return pd.concat(_tokenize_export(file_path), ignore_index=True)
+
+def iter_export_chunks(file_path, chunksize):
+    """Yield read_export frames of at most chunksize rows."""
+    # Chunked read_csv silently drops the extra cells of wide rows rather than failing, so chunks always use the csv module
+    yield from _tokenize_export(file_path, chunksize)
 
 def load_and_combine_csv(directory):
     """Load all CSV files in the specified directory and combine them into a single DataFrame."""
-    pattern = os.path.join(directory, '*.csv')
-    csv_files = glob.glob(pattern)
-    df_list = [pd.read_csv(file) for file in csv_files]
+    csv_files = list_csv_files(directory)
+    df_list = [read_export(file) for file in csv_files]
     combined_df = pd.concat(df_list, ignore_index=True)
     return combined_df
 
+def iter_csv_chunks(directory, chunksize):
+    """Yield DataFrames of at most chunksize rows from each CSV file in the specified directory in turn."""
+    for file in list_csv_files(directory):
+        yield from iter_export_chunks(file, chunksize)
+
+def map_csv_parallel(directory, preprocess_file, workers):
+    """
+    Run preprocess_file on each CSV file in the specified directory in a pool of worker processes.
+    Results are returned in sorted file order, so they do not depend on which worker finishes first.
+    """
+    csv_files = list_csv_files(directory)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(preprocess_file, csv_files))
+
+def preprocess_csv_parallel(directory, preprocess_file, workers):
+    """Run preprocess_file on each CSV file in a pool of worker processes and combine the DataFrames in file order."""
+    return pd.concat(map_csv_parallel(directory, preprocess_file, workers), ignore_index=True)
+
 def load_csv(file_path):
     """Safely load a CSV file into a DataFrame."""
     try:
-        return pd.read_csv(file_path)
+        return read_export(file_path)
     except Exception as e:
         print(f"Failed to load file {file_path}: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+def atomic_write(file_path, writer):
+    """
+    Call writer(temp_path) to write a file under a temporary name beside file_path, then rename it into place,
+    so a crash never leaves a partial file. The temporary file is removed if writing fails.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', prefix='.', suffix='.tmp')
+    os.close(fd)
+    try:
+        writer(temp_path)
+        # mkstemp creates the file readable by its owner only; give it the mode open() would have
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _write_csv(df, file_path):
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        df.to_csv(f, index=False)
+
+def write_csv_atomic(df, file_path):
+    """Write a DataFrame to CSV with atomic_write."""
+    atomic_write(file_path, lambda temp_path: _write_csv(df, temp_path))
+
+def build_sis_zip(tables):
+    """Write each DataFrame as a CSV member of an in-memory zip archive, e.g. {'courses.csv': courses_df}."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, df in tables.items():
+            with archive.open(name, 'w') as member, io.TextIOWrapper(member, encoding='utf-8', newline='') as text:
+                df.to_csv(text, index=False)
+    return buffer.getvalue()
+
+### ===========
+### Stage Store
+### ===========
+
+def stage_path(name, stage_dir=STAGE_DIR):
+    """Path of a stored pipeline table."""
+    return os.path.join(stage_dir, f'{name}.arrow')
+
+def save_stage(df, name, stage_dir=STAGE_DIR):
+    """
+    Store a pipeline table as an uncompressed Arrow IPC (Feather v2) file, typed and ready to memory-map.
+    Text columns are written as strings and categoricals as dictionary columns. Requires pyarrow.
+    """
+    with measure('save_stage', rows_in=len(df), table=name):
+        os.makedirs(stage_dir, exist_ok=True)
+        text_columns = df.select_dtypes(include=['object', 'string']).columns
+        df = df.astype({column: 'string' for column in text_columns}).reset_index(drop=True)
+        atomic_write(stage_path(name, stage_dir), lambda temp_path: df.to_feather(temp_path, compression='uncompressed'))
+
+def load_stage(name, stage_dir=STAGE_DIR):
+    """
+    Load a table stored by save_stage, memory-mapping the file.
+    Text columns come back in pandas' default string dtype with NaN blanks: Arrow-backed without a copy
+    where pandas infers strings (pandas 3), objects otherwise. Stage tables hold only text, categorical
+    and NumPy columns, as nullable integer columns would come back as floats.
+    """
+    import pyarrow.feather as feather
+    with measure('load_stage', table=name) as record:
+        # Without the pandas metadata, text is not restored as the pd.NA "string" dtype save_stage wrote it with
+        df = feather.read_table(stage_path(name, stage_dir), memory_map=True).to_pandas(ignore_metadata=True)
+        record['rows_out'] = len(df)
+    return df
+
+### =============
+### Parse Caching
+### =============
+
+def hash_files(file_paths):
+    """Hash the names and contents of the given files together with the cache version."""
+    digest = hashlib.sha256(CACHE_VERSION.encode())
+    for file_path in file_paths:
+        digest.update(os.path.basename(file_path).encode())
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _write_pickle(value, file_path):
+    with open(file_path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_cached(stage, input_paths, build, *args, cache_dir=CACHE_DIR):
+    """
+    Return the output of build(*args), served from the on-disk cache when the input files are unchanged.
+
+    Args:
+        stage (str): Name of the pipeline stage, used to namespace cache entries.
+        input_paths (list): Files whose contents determine the stage output.
+        build (callable): Function producing the stage output on a cache miss.
+
+    Returns:
+        The stage output, either unpickled from the cache or freshly built.
+    """
+    input_paths = [path for path in input_paths if os.path.exists(path)]
+    cache_path = os.path.join(cache_dir, f'{stage}-{hash_files(input_paths)}.pkl')
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            result = pickle.load(f)
+        # Touch the entry so eviction by age counts from its last use
+        os.utime(cache_path)
+        print(f"Loaded {stage} from cache")
+        return result
+
+    result = build(*args)
+    os.makedirs(cache_dir, exist_ok=True)
+    atomic_write(cache_path, lambda temp_path: _write_pickle(result, temp_path))
+    evict_cache(cache_dir=cache_dir)
+    return result
+
+def evict_cache(max_age=CACHE_MAX_AGE, max_bytes=CACHE_MAX_BYTES, cache_dir=CACHE_DIR):
+    """Remove cache entries older than max_age seconds, then the least recently used until under max_bytes."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith('.pkl'):
+            # Another process sharing the cache may evict entries while this one scans it
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort(reverse=True)
+
+    now = time.time()
+    total_bytes = 0
+    for modified, size, path in entries:
+        total_bytes += size
+        if now - modified > max_age or total_bytes > max_bytes:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
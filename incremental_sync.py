@@ -0,0 +1,85 @@
+import pandas as pd
+import os
+from file_handling import atomic_write
+
+SNAPSHOT_DIR = 'temp_outputs/snapshots'
+KEY_COLUMNS = ['user_id', 'course_id', 'role']
+
+def write_parquet_atomic(df, file_path):
+    """Write a DataFrame to parquet with atomic_write, creating the snapshot directory if needed."""
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    atomic_write(file_path, lambda temp_path: df.to_parquet(temp_path, index=False))
+
+def snapshot_path(term, snapshot_dir=SNAPSHOT_DIR):
+    """Path of the snapshot holding the last enrollments posted for a term."""
+    return os.path.join(snapshot_dir, f'enrollments_{term}.parquet')
+
+def load_snapshot(term, snapshot_dir=SNAPSHOT_DIR):
+    """Load the last posted enrollments for a term, or None if the term has never been posted."""
+    file_path = snapshot_path(term, snapshot_dir)
+    if not os.path.exists(file_path):
+        return None
+    return pd.read_parquet(file_path)
+
+def snapshot_terms(snapshot_dir=SNAPSHOT_DIR):
+    """Terms that have a snapshot of posted enrollments."""
+    if not os.path.isdir(snapshot_dir):
+        return []
+    prefix, suffix = 'enrollments_', '.parquet'
+    return sorted(name[len(prefix):-len(suffix)] for name in os.listdir(snapshot_dir) if name.startswith(prefix) and name.endswith(suffix))
+
+def save_snapshot(enrollments_df, term, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Record the enrollments that were just posted for a term, sorted by key so the file compresses well.
+    A term left with no enrollments has its snapshot removed once its deletions are posted.
+    """
+    file_path = snapshot_path(term, snapshot_dir)
+    if enrollments_df.empty:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return
+    write_parquet_atomic(enrollments_df.sort_values(KEY_COLUMNS).astype('string'), file_path)
+
+def diff_enrollments(current_df, previous_df):
+    """
+    Compare a term's enrollments against its last posted snapshot.
+
+    Args:
+        current_df (pd.DataFrame): Enrollments as they should be in Canvas now.
+        previous_df (pd.DataFrame or None): Enrollments from the last successful post.
+
+    Returns:
+        pd.DataFrame: New or changed enrollments, followed by dropped enrollments marked status=deleted.
+    """
+    if previous_df is None:
+        return current_df
+
+    current_keys = pd.MultiIndex.from_frame(current_df[KEY_COLUMNS].astype('string'))
+    previous_keys = pd.MultiIndex.from_frame(previous_df[KEY_COLUMNS].astype('string'))
+
+    # Status is compared as well, so an override that changes it is uploaded again
+    current_states = pd.MultiIndex.from_frame(current_df[KEY_COLUMNS + ['status']].astype('string'))
+    previous_states = pd.MultiIndex.from_frame(previous_df[KEY_COLUMNS + ['status']].astype('string'))
+
+    added_df = current_df[~current_states.isin(previous_states)]
+    dropped_df = previous_df[~previous_keys.isin(current_keys)].assign(status='deleted')
+    return pd.concat([added_df, dropped_df.reindex(columns=current_df.columns)], ignore_index=True)
+
+def load_course_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """Load the Canvas course rows from the last successful post, or None if courses have never been posted."""
+    file_path = os.path.join(snapshot_dir, 'courses.parquet')
+    if not os.path.exists(file_path):
+        return None
+    return pd.read_parquet(file_path)
+
+def save_course_snapshot(courses_df, snapshot_dir=SNAPSHOT_DIR):
+    """Record the Canvas course rows that were just posted."""
+    write_parquet_atomic(courses_df.astype('string'), os.path.join(snapshot_dir, 'courses.parquet'))
+
+def diff_courses(current_df, previous_df):
+    """Canvas course rows that are new or differ in any column from the last posted snapshot."""
+    if previous_df is None:
+        return current_df
+    current_rows = pd.MultiIndex.from_frame(current_df.astype('string').fillna(''))
+    previous_rows = pd.MultiIndex.from_frame(previous_df.reindex(columns=current_df.columns).astype('string').fillna(''))
+    return current_df[~current_rows.isin(previous_rows)]
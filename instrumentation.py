@@ -0,0 +1,146 @@
+"""
+Per-stage timing and memory instrumentation for sync runs.
+
+Stages are recorded with the measure() context manager or the instrumented()
+decorator, and the collected records are written out as a JSON run report.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+_records = []
+_lock = threading.Lock()
+_started = time.perf_counter()
+_started_at = datetime.now(timezone.utc).isoformat()
+
+def reset():
+    """Forget all recorded stages and restart the run clock."""
+    global _started, _started_at
+    with _lock:
+        _records.clear()
+    _started = time.perf_counter()
+    _started_at = datetime.now(timezone.utc).isoformat()
+
+def start_memory_tracing():
+    """
+    Track Python allocations so each stage also reports its own allocation peak. This slows the run down
+    noticeably, and peaks of stages running concurrently (per-term writes, posts) overlap.
+    """
+    tracemalloc.start()
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else None
+
+def _peak_rss_mib():
+    """High-water mark of the process resident set size so far. It never goes down, so it suits whole runs, not stages."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and KiB elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _rss_mib():
+    """Current resident set size, read from /proc where available (Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(resident_pages * _PAGE_SIZE / (1024 * 1024), 1)
+
+def _frame_lengths(values):
+    for value in values:
+        if isinstance(value, tuple):
+            yield from _frame_lengths(value)
+        elif getattr(value, 'ndim', None) == 2:
+            yield len(value)
+
+def _row_counts(values):
+    """Row counts of the DataFrames among values: None if there are none, an int for one, a list otherwise."""
+    counts = list(_frame_lengths(values))
+    if not counts:
+        return None
+    return counts[0] if len(counts) == 1 else counts
+
+@contextmanager
+def measure(stage, rows_in=None, **details):
+    """
+    Record wall time, CPU time and memory growth for the enclosed block.
+    The yielded record can be updated, e.g. record['rows_out'] = len(df).
+    """
+    record = {'stage': stage, **details, 'rows_in': rows_in, 'rows_out': None}
+    rss_start = _rss_mib()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        traced_start = tracemalloc.get_traced_memory()[0]
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+        # CPU time is process-wide, so it includes any threads running alongside this stage
+        record['cpu_seconds'] = round(time.process_time() - cpu_start, 4)
+        # Resident memory after the stage and how much it grew; stages running concurrently share the process
+        record['rss_mib'] = _rss_mib()
+        record['rss_growth_mib'] = None if rss_start is None else round(record['rss_mib'] - rss_start, 1)
+        if tracing:
+            # Allocation peak above what was already allocated when the stage started
+            record['peak_traced_mib'] = round((tracemalloc.get_traced_memory()[1] - traced_start) / (1024 * 1024), 1)
+        with _lock:
+            _records.append(record)
+
+def instrumented(stage):
+    """Decorator recording each call of a pipeline function, with the row counts of its DataFrame arguments and results."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(stage, rows_in=_row_counts(args)) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = _row_counts((result,))
+            return result
+        return wrapper
+    return decorator
+
+@contextmanager
+def profile(output_path):
+    """Run the enclosed block under cProfile and dump the stats to output_path (view with python -m pstats)."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+
+def records():
+    """A copy of the stages recorded so far, in completion order."""
+    with _lock:
+        return list(_records)
+
+def write_report(report_path, **metadata):
+    """Write the recorded stages, total run time and any extra metadata as a JSON run report."""
+    report = {
+        'started_at': _started_at,
+        'wall_seconds': round(time.perf_counter() - _started, 4),
+        'peak_rss_mib': _peak_rss_mib(),
+        **metadata,
+        'stages': records(),
+    }
+    if os.path.dirname(report_path):
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    return report
@@ -1,75 +1,199 @@
 import pandas as pd
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from student_preprocessing import preprocess_enrollment_data
-from teacher_preprocessing import preprocess_teacher_enrollments
-from file_handling import load_csv
-from course_preprocessing import format_course_data, update_enrollments, format_ids, update_and_save_courses
-from api_posting import post_csv_to_api
-
-def load_and_preprocess_data():
-    enrollments_df = preprocess_enrollment_data('temp_inputs/student_enroll/')
-    teacher_enroll_df = preprocess_teacher_enrollments('temp_inputs/teacher_enroll/')
-    courses_df = load_csv('temp_inputs/courses.csv')
+from teacher_preprocessing import preprocess_teacher_enrollments, write_teacher_report
+from teacher_resolver import load_staff
+from file_handling import list_csv_files, read_export, load_cached, build_sis_zip, write_csv_atomic, save_stage, load_stage, stage_path, STAGE_DIR, CACHE_DIR
+from course_preprocessing import compact_enrollments, update_enrollments, format_ids, select_canvas_courses, update_and_save_courses
+from api_posting import post_csvs_concurrently, post_zip_and_wait, SUCCESS_STATES
+from incremental_sync import load_snapshot, save_snapshot, snapshot_terms, diff_enrollments, load_course_snapshot, save_course_snapshot, diff_courses
+from course_catalogue import update_catalogue, load_course_maps
+from overrides import apply_overrides
+from validation import validate_enrollments, known_user_index
+from user_sync import build_users, write_users, save_user_fingerprints
+from instrumentation import instrumented, measure, write_report
+
+INPUT_ROOT = 'temp_inputs'
+OUTPUT_ROOT = 'temp_outputs'
+
+def load_and_preprocess_data(chunksize=None, workers=None, input_root=INPUT_ROOT, output_root=OUTPUT_ROOT, teacher_ids_path=None, retire_missing_courses=False, cache_dir=CACHE_DIR):
+    # Preprocessed exports are reused from the parse cache while their input files are unchanged
+    student_dir = os.path.join(input_root, 'student_enroll')
+    with measure('parse_students') as record:
+        enrollments_df = load_cached('students', list_csv_files(student_dir), preprocess_enrollment_data, student_dir, chunksize, workers, cache_dir=cache_dir)
+        record['rows_out'] = len(enrollments_df)
+    teacher_dir = os.path.join(input_root, 'teacher_enroll')
+    # Schools sharing one staff export can point teacher_ids_path at it
+    teacher_ids_path = teacher_ids_path or os.path.join(input_root, 'teacher_ids.csv')
+    teacher_inputs = list_csv_files(teacher_dir) + [teacher_ids_path]
+    with measure('parse_teachers') as record:
+        teacher_enroll_df, teacher_report_df = load_cached('teachers', teacher_inputs, preprocess_teacher_enrollments, teacher_dir, chunksize, workers, teacher_ids_path, cache_dir, cache_dir=cache_dir)
+        record['rows_out'] = len(teacher_enroll_df)
+    # Written outside the cache so a cached parse still reports its unresolved names
+    write_teacher_report(teacher_report_df, os.path.join(output_root, 'unresolved_teachers.csv'))
+    with measure('parse_courses') as record:
+        # courses.csv is merged into the persistent catalogue, which keeps the hand-maintained columns
+        courses_df = update_catalogue(os.path.join(input_root, 'courses.csv'), os.path.join(output_root, 'course_catalogue.parquet'), retire_missing_courses)
+        record['rows_out'] = len(courses_df)
     return enrollments_df, teacher_enroll_df, courses_df
 
-def save_enrollments_by_term(full_enrollment_df, token, canvas_url, account_id, selected_terms):
-    for term in full_enrollment_df['term_id'].dropna().unique():
-        output_dir = f'temp_outputs/enrollments_{term}'
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+def write_term_enrollments(term, subset, selected_terms, incremental=False, output_root=OUTPUT_ROOT):
+    """Write one term's enrollments.csv (and its delta when incremental); returns the log lines and the term's upload, if any."""
+    with measure('write_term', rows_in=len(subset), term=term) as record:
+        messages, upload = _write_term_files(term, subset, selected_terms, incremental, output_root)
+        record['rows_out'] = len(upload[1]) if upload is not None else 0
+    return messages, upload
+
+def _write_term_files(term, subset, selected_terms, incremental, output_root):
+    output_dir = os.path.join(output_root, f'enrollments_{term}')
+    os.makedirs(output_dir, exist_ok=True)
+    file_path = os.path.join(output_dir, 'enrollments.csv')
+    write_csv_atomic(subset, file_path)
+    messages = [f"CSV file created: {file_path}"]
+
+    if term not in selected_terms:
+        messages.append(f"Skipping API post for term {term}")
+        return messages, None
+
+    upload_path, upload_df = file_path, subset
+    if incremental:
+        # Only upload what changed since the last successful post for this term
+        upload_df = diff_enrollments(subset, load_snapshot(term, os.path.join(output_root, 'snapshots')))
+        upload_path = os.path.join(output_dir, 'enrollments_delta.csv')
+        if upload_df.empty:
+            # Remove any delta left by an earlier run so a later post stage cannot pick it up
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+            messages.append(f"No enrollment changes for term {term}. Skipping API post.")
+            return messages, None
+        write_csv_atomic(upload_df, upload_path)
+        messages.append(f"Delta CSV file created: {upload_path} ({len(upload_df)} of {len(subset)} rows)")
+    return messages, (upload_path, upload_df, subset)
+
+def list_terms(full_enrollment_df, incremental=False, output_root=OUTPUT_ROOT):
+    """Terms with enrollments, plus, when incremental, the posted terms that have none left and need their drops sent."""
+    terms = set(full_enrollment_df['term_id'].dropna().unique())
+    if incremental:
+        terms.update(snapshot_terms(os.path.join(output_root, 'snapshots')))
+    return sorted(terms)
+
+def save_enrollments_by_term(full_enrollment_df, selected_terms, incremental=False, workers=4, output_root=OUTPUT_ROOT):
+    """Write each term's enrollments.csv and return the upload for each selected term as {term: (upload_path, upload_df, subset)}."""
+    # Partition the frame by term in one pass, then write the partitions concurrently
+    enrollment_df = full_enrollment_df.drop(columns=['subject', 'term_id'])
+    partitions = dict(list(enrollment_df.groupby(full_enrollment_df['term_id'], sort=False, observed=True)))
+    # A selected term whose last enrollment disappeared still gets an empty partition, so its drops are posted as deleted
+    for term in selected_terms:
+        partitions.setdefault(term, enrollment_df.iloc[:0])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            term: executor.submit(write_term_enrollments, term, subset, selected_terms, incremental, output_root)
+            for term, subset in partitions.items()
+        }
+
+    uploads = {}
+    for term, future in futures.items():
+        messages, upload = future.result()
+        print("\n".join(messages))
+        if upload is not None:
+            uploads[term] = upload
+    return uploads
+
+def collect_uploads(selected_terms, incremental=False, output_root=OUTPUT_ROOT):
+    """Rebuild the uploads written by an earlier save_enrollments_by_term run from the files on disk."""
+    uploads = {}
+    for term in selected_terms:
+        output_dir = os.path.join(output_root, f'enrollments_{term}')
         file_path = os.path.join(output_dir, 'enrollments.csv')
-        subset = full_enrollment_df[full_enrollment_df['term_id'] == term].drop(columns=['subject', 'term_id'])
-        subset.to_csv(file_path, index=False)
+        upload_path = os.path.join(output_dir, 'enrollments_delta.csv') if incremental else file_path
+        if not os.path.exists(upload_path):
+            print(f"Nothing to post for term {term}")
+            continue
+        subset = pd.read_csv(file_path, dtype=str)
+        upload_df = pd.read_csv(upload_path, dtype=str) if incremental else subset
+        uploads[term] = (upload_path, upload_df, subset)
+    return uploads
 
-        print(f"CSV file created: {file_path}")
+def post_enrollments_by_term(uploads, token, canvas_url, account_id, incremental=False, max_concurrency=4, output_root=OUTPUT_ROOT):
+    # Post the selected terms concurrently and wait for each SIS import to finish
+    results = post_csvs_concurrently([upload_path for upload_path, _, _ in uploads.values()], token, canvas_url, account_id, max_concurrency)
+    for term, (upload_path, _, subset) in uploads.items():
+        sis_import = results[upload_path]
+        print(f"Posted {upload_path} to API. SIS import {sis_import.get('id')}: {sis_import.get('workflow_state')}")
+        if incremental and sis_import.get('workflow_state') in SUCCESS_STATES:
+            save_snapshot(subset, term, os.path.join(output_root, 'snapshots'))
+    return {term: results[upload_path] for term, (upload_path, _, _) in uploads.items()}
 
-        if term in selected_terms:
-            # Post the CSV file to the API
-            response = post_csv_to_api(file_path, token, canvas_url, account_id)
-            print(f"Posted {file_path} to API. Response: {response.status_code} - {response.text}")
-        else:
-            print(f"Skipping API post for term {term}")
+def post_users(user_upload, token, canvas_url, account_id, output_root=OUTPUT_ROOT):
+    # Users go first and are waited on, so new users exist before their enrollments are imported
+    upload_path, upload_df = user_upload
+    sis_import = post_csvs_concurrently([upload_path], token, canvas_url, account_id)[upload_path]
+    print(f"Posted {upload_path} to API. SIS import {sis_import.get('id')}: {sis_import.get('workflow_state')}")
+    if sis_import.get('workflow_state') in SUCCESS_STATES:
+        save_user_fingerprints(upload_df, os.path.join(output_root, 'snapshots'))
+    return sis_import
 
-def apply_overrides(full_enrollment_df, override_file_path):
-    if os.path.exists(override_file_path):
-        overrides_df = pd.read_csv(override_file_path)
-        full_enrollment_df = pd.concat([full_enrollment_df, overrides_df]).drop_duplicates(subset=['user_id', 'course_id'], keep='last')
-        print(f"Overrides applied from {override_file_path}")
-    else:
-        print(f"No override file found at {override_file_path}. Skipping overrides.")
-    return full_enrollment_df
+def post_sis_bundle(uploads, courses_df, token, canvas_url, account_id, incremental=False, output_root=OUTPUT_ROOT, user_upload=None):
+    # Send users, courses and every selected term's enrollments to Canvas as a single zipped SIS import
+    snapshot_dir = os.path.join(output_root, 'snapshots')
+    canvas_courses = select_canvas_courses(courses_df)
+    # Incremental bundles only carry the courses that changed since the last successful post
+    course_rows = diff_courses(canvas_courses, load_course_snapshot(snapshot_dir)) if incremental else canvas_courses
+    tables = {}
+    if user_upload is not None:
+        tables['users.csv'] = user_upload[1]
+    if not course_rows.empty:
+        tables['courses.csv'] = course_rows
+    if uploads:
+        tables['enrollments.csv'] = pd.concat([upload_df for _, upload_df, _ in uploads.values()], ignore_index=True)
+    if not tables:
+        print("No user, course or enrollment changes. Skipping SIS bundle.")
+        return None
+    zip_bytes = build_sis_zip(tables)
+    sis_import = post_zip_and_wait(zip_bytes, token, canvas_url, account_id)
+    user_count = len(user_upload[1]) if user_upload is not None else 0
+    print(f"Posted SIS bundle ({len(zip_bytes)} bytes, {user_count} users, {len(course_rows)} courses, terms: {', '.join(map(str, uploads)) or 'none'}). SIS import {sis_import.get('id')}: {sis_import.get('workflow_state')}")
+    if user_upload is not None and sis_import.get('workflow_state') in SUCCESS_STATES:
+        save_user_fingerprints(user_upload[1], snapshot_dir)
+    if incremental and sis_import.get('workflow_state') in SUCCESS_STATES:
+        for term, (_, _, subset) in uploads.items():
+            save_snapshot(subset, term, snapshot_dir)
+        save_course_snapshot(canvas_courses, snapshot_dir)
+    return sis_import
 
+@instrumented('add_teachers_to_all_courses')
 def add_teachers_to_all_courses(full_enrollment_df, courses_df, teacher_list_file):
     if os.path.exists(teacher_list_file):
         # Read teacher list which now contains user_id, name, and role
-        teacher_list = pd.read_csv(teacher_list_file)
+        teacher_list = read_export(teacher_list_file)
         
         # Ensure that necessary columns are present in the CSV
         if not {'user_id', 'name', 'role'}.issubset(teacher_list.columns):
             print(f"Error: The teacher list CSV must contain 'user_id', 'name', and 'role' columns.")
             return full_enrollment_df
         
-        new_teacher_enrollments = []
-
-        # Iterate over each course and assign each teacher
-        for _, course in courses_df.iterrows():
-            if(course['CANVAS_NEEDED'] != "N"):
-                for _, teacher in teacher_list.iterrows():
-                    new_teacher_enrollments.append({
-                        'course_name': course['long_name'],
-                        'course_id': course['course_id'],
-                        'subject': course.get('subject', ''),
-                        'term_id': course.get('term_id', ''),
-                        'name': teacher['name'],  # Pull the name from the teacher list
-                        'user_id': teacher['user_id'],
-                        'type': '',  # This can be constant if you need it to match Canvas formatting
-                        'role': teacher['role'],  # Pull the role from the teacher list
-                        'status': 'active'
-                    })
+        # Pair every Canvas course with every listed teacher in a single cross join
+        canvas_courses = courses_df['CANVAS_NEEDED'] != "N"
+        course_rows = pd.DataFrame({
+            'course_name': courses_df['long_name'],
+            'course_id': courses_df['course_id'],
+            'subject': courses_df['subject'] if 'subject' in courses_df.columns else '',
+            'term_id': courses_df['term_id'] if 'term_id' in courses_df.columns else '',
+        })[canvas_courses]
+        teachers_df = course_rows.merge(teacher_list[['name', 'user_id', 'role']], how='cross')
+        teachers_df['type'] = ''  # This can be constant if you need it to match Canvas formatting
+        teachers_df['status'] = 'active'
+        teachers_df = teachers_df[['course_name', 'course_id', 'subject', 'term_id', 'name', 'user_id', 'type', 'role', 'status']]
+
+        # Skip pairs that are already enrolled; only the listed teachers' existing enrollments can collide
+        existing = full_enrollment_df.loc[full_enrollment_df['user_id'].isin(teacher_list['user_id']), ['user_id', 'course_id']]
+        existing_keys = pd.MultiIndex.from_frame(existing.astype(str))
+        new_keys = pd.MultiIndex.from_frame(teachers_df[['user_id', 'course_id']].astype(str))
+        teachers_df = teachers_df[~new_keys.isin(existing_keys) & ~new_keys.duplicated()]
 
         # Add the new teacher enrollments to the full enrollment dataframe
-        teachers_df = pd.DataFrame(new_teacher_enrollments)
         full_enrollment_df = pd.concat([full_enrollment_df, teachers_df], ignore_index=True)
         print(f"Added teachers to every course in the final courses.csv.")
     else:
@@ -89,26 +213,72 @@ def get_user_selected_terms(available_terms):
     
     return selected_terms
 
-def main():
-    load_dotenv()  # Load environment variables from .env file
-    enrollments_df, teacher_enroll_df, courses_df = load_and_preprocess_data()
-    full_enrollment_df = pd.concat([enrollments_df, teacher_enroll_df])
-    courses_df, term_map, merge_map = format_course_data(courses_df)
+def parse_stage(chunksize=None, workers=None, input_root=INPUT_ROOT, output_root=OUTPUT_ROOT, stage_dir=STAGE_DIR, teacher_ids_path=None, retire_missing_courses=False, cache_dir=CACHE_DIR):
+    """Parse the MySchool exports and merge courses.csv into the course catalogue, storing the tables for later stages."""
+    teacher_ids_path = teacher_ids_path or os.path.join(input_root, 'teacher_ids.csv')
+    enrollments_df, teacher_enroll_df, courses_df = load_and_preprocess_data(chunksize, workers, input_root, output_root, teacher_ids_path, retire_missing_courses, cache_dir)
+    # Users come from the staff export and the student names, which the enrollment table drops
+    users_df = build_users(enrollments_df, load_staff(teacher_ids_path))
+    save_stage(users_df, 'users', stage_dir)
+    save_stage(enrollments_df, 'students', stage_dir)
+    save_stage(teacher_enroll_df, 'teachers', stage_dir)
+    save_stage(courses_df, 'courses', stage_dir)
+    return enrollments_df, teacher_enroll_df, courses_df
+
+def transform_stage(enrollments_df, teacher_enroll_df, courses_df, input_root=INPUT_ROOT, stage_dir=STAGE_DIR, output_root=OUTPUT_ROOT, cache_dir=CACHE_DIR):
+    """Build the final enrollment table from the preprocessed tables and store it for the writers."""
+    full_enrollment_df = compact_enrollments(pd.concat([enrollments_df, teacher_enroll_df], ignore_index=True))
+    term_map, merge_map = load_course_maps(os.path.join(output_root, 'course_catalogue.parquet'), cache_dir)
     full_enrollment_df = update_enrollments(full_enrollment_df, courses_df, term_map, merge_map)
     full_enrollment_df = format_ids(full_enrollment_df)
+    listed_users = full_enrollment_df['user_id'].unique()
 
     # Apply overrides if provided
-    override_file_path = 'temp_inputs/override.csv'
+    override_file_path = os.path.join(input_root, 'override.csv')
     if override_file_path:
-        full_enrollment_df = apply_overrides(full_enrollment_df, override_file_path)
+        full_enrollment_df = apply_overrides(full_enrollment_df, override_file_path, term_map, merge_map)
 
     # Add certain teachers to every course
-    teacher_list_file = 'temp_inputs/add_to_all.csv'
+    teacher_list_file = os.path.join(input_root, 'add_to_all.csv')
     if teacher_list_file:
         full_enrollment_df = add_teachers_to_all_courses(full_enrollment_df, courses_df, teacher_list_file)
 
-    # Get the list of available terms
-    available_terms = sorted(full_enrollment_df['term_id'].dropna().unique())
+    # Overrides and add-to-all rows arrive as plain strings; restore the compact schema
+    full_enrollment_df = compact_enrollments(full_enrollment_df)
+    # Enrollments may name the users in the users table and anyone added by hand in override.csv or add_to_all.csv
+    user_index = None
+    if os.path.exists(stage_path('users', stage_dir)):
+        hand_added = pd.Index(full_enrollment_df['user_id'].unique()).difference(pd.Index(listed_users))
+        user_index = known_user_index(load_stage('users', stage_dir)['user_id'], hand_added)
+    # Drop duplicates and quarantine rows Canvas would reject before anything is written
+    full_enrollment_df = validate_enrollments(full_enrollment_df, courses_df, os.path.join(output_root, 'quarantined_enrollments.csv'), user_index)
+    save_stage(full_enrollment_df, 'enrollments', stage_dir)
+    return full_enrollment_df, courses_df
+
+def main():
+    load_dotenv()  # Load environment variables from .env file
+
+    # SYNC_RESUME_FROM=transform or write restarts from the tables stored by an earlier run
+    resume_from = os.getenv('SYNC_RESUME_FROM', '')
+    if resume_from == 'write':
+        full_enrollment_df, courses_df = load_stage('enrollments'), load_stage('courses')
+    else:
+        if resume_from == 'transform':
+            parsed = load_stage('students'), load_stage('teachers'), load_stage('courses')
+        else:
+            # Parse export files in SYNC_WORKERS processes, or stream them in SYNC_CHUNKSIZE row chunks
+            chunksize = int(os.getenv('SYNC_CHUNKSIZE', '0')) or None
+            workers = int(os.getenv('SYNC_WORKERS', '0')) or None
+            # With SYNC_RETIRE_MISSING_COURSES set, courses.csv is a full export and courses missing from it are retired
+            retire_missing_courses = os.getenv('SYNC_RETIRE_MISSING_COURSES', '').lower() in ('1', 'true', 'yes')
+            parsed = parse_stage(chunksize, workers, retire_missing_courses=retire_missing_courses)
+        full_enrollment_df, courses_df = transform_stage(*parsed)
+
+    # Upload only the changes since the last post when SYNC_INCREMENTAL is set
+    incremental = os.getenv('SYNC_INCREMENTAL', '').lower() in ('1', 'true', 'yes')
+
+    # Get the list of available terms, including posted terms whose enrollments have all gone
+    available_terms = list_terms(full_enrollment_df, incremental)
     
     # Get user-selected terms for posting
     selected_terms = get_user_selected_terms(available_terms)
@@ -118,8 +288,33 @@ def main():
     canvas_url = os.getenv('CANVAS_URL')
     account_id = os.getenv('CANVAS_ACCOUNT_ID')
     
-    save_enrollments_by_term(full_enrollment_df, token, canvas_url, account_id, selected_terms)
-    update_and_save_courses(courses_df)
+    max_concurrency = int(os.getenv('SYNC_UPLOAD_CONCURRENCY', '4'))
+    # Send courses and enrollments as one zipped SIS import when SYNC_BUNDLE is set
+    bundle = os.getenv('SYNC_BUNDLE', '').lower() in ('1', 'true', 'yes')
+
+    uploads = save_enrollments_by_term(full_enrollment_df, selected_terms, incremental)
+    # Courses are only posted in bundles, so only bundles have a course snapshot to diff against
+    update_and_save_courses(courses_df, previous_df=load_course_snapshot() if incremental and bundle else None)
+    # SYNC_USERS also posts the users that are new or changed since the last successful post,
+    # with login IDs built from the SYNC_LOGIN_ID format, e.g. "{number}@school.example"
+    user_upload = None
+    if os.getenv('SYNC_USERS', '').lower() in ('1', 'true', 'yes'):
+        login_id_format = os.getenv('SYNC_LOGIN_ID')
+        if login_id_format:
+            user_upload = write_users(load_stage('users'), login_id_format)
+        else:
+            print("SYNC_USERS is set without SYNC_LOGIN_ID. Users will not be posted.")
+    if bundle:
+        post_sis_bundle(uploads, courses_df, token, canvas_url, account_id, incremental, user_upload=user_upload)
+    else:
+        if user_upload is not None:
+            post_users(user_upload, token, canvas_url, account_id)
+        post_enrollments_by_term(uploads, token, canvas_url, account_id, incremental, max_concurrency)
+
+    # SYNC_REPORT names a JSON file for the per-stage timings and memory of this run
+    report_path = os.getenv('SYNC_REPORT')
+    if report_path:
+        write_report(report_path, resume_from=resume_from or None, terms=[str(term) for term in selected_terms])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import os
+from course_preprocessing import append_enrollments, plain_ids, prefixed_ids
+from file_handling import read_export
+from instrumentation import instrumented
+
+# Fields a rule can match on; a blank or "*" field matches every enrollment
+RULE_FIELDS = ['user_id', 'course_id', 'term_id']
+ACTIONS = {'add', 'drop'}
+
+def normalize_rules(overrides_df, term_map=None, merge_map=None):
+    """
+    Bring override rules into the formatted ID scheme used by the enrollment table.
+    Raw MySchool IDs become u/c IDs (merged courses follow their merge code); IDs already formatted are kept.
+    Add rules without a term_id take the term of their course.
+    """
+    overrides_df = overrides_df.copy()
+    overrides_df['action'] = overrides_df['action'].fillna('add').str.strip().str.lower() if 'action' in overrides_df.columns else 'add'
+    for field in RULE_FIELDS:
+        if field not in overrides_df.columns:
+            overrides_df[field] = None
+        overrides_df[field] = overrides_df[field].str.strip().replace({'*': np.nan, '': np.nan})
+
+    # Raw course IDs are looked up the way the catalogue keys them
+    raw_courses = plain_ids(overrides_df['course_id'])
+    merged_courses = raw_courses.map(merge_map).fillna(raw_courses) if merge_map else raw_courses
+    overrides_df['user_id'] = prefixed_ids(overrides_df['user_id'], 'u')
+    overrides_df['course_id'] = prefixed_ids(merged_courses, 'c')
+
+    if term_map:
+        formatted_terms = dict(zip(prefixed_ids(pd.Series(list(term_map), dtype=object), 'c'), term_map.values()))
+        course_terms = raw_courses.map(term_map).fillna(overrides_df['course_id'].map(formatted_terms))
+        is_add = overrides_df['action'] == 'add'
+        overrides_df.loc[is_add, 'term_id'] = overrides_df.loc[is_add, 'term_id'].fillna(course_terms[is_add])
+    return overrides_df
+
+def _valid_rules(overrides_df):
+    """Drop rules that cannot be applied, reporting each kind of problem once."""
+    invalid = {
+        'unknown action': ~overrides_df['action'].isin(ACTIONS),
+        'add missing user_id or course_id': (overrides_df['action'] == 'add') & overrides_df[['user_id', 'course_id']].isna().any(axis=1),
+        'drop matching every enrollment': (overrides_df['action'] == 'drop') & overrides_df[RULE_FIELDS].isna().all(axis=1),
+    }
+    keep = np.ones(len(overrides_df), dtype=bool)
+    for problem, mask in invalid.items():
+        if mask.any():
+            print(f"Skipping {mask.sum()} override rows: {problem}")
+        keep &= ~mask.to_numpy()
+    return overrides_df[keep]
+
+def match_rules(full_enrollment_df, rules):
+    """
+    Mask of the enrollments matched by any rule.
+    Rules are grouped by which fields they set; each group narrows the table with a hashed isin on its
+    first field, and full keys are only compared for the few enrollments that share it.
+    """
+    mask = np.zeros(len(full_enrollment_df), dtype=bool)
+    specified = rules[RULE_FIELDS].notna()
+    for pattern in specified.drop_duplicates().itertuples(index=False):
+        fields = [field for field, is_set in zip(RULE_FIELDS, pattern) if is_set]
+        group = rules.loc[(specified == list(pattern)).all(axis=1), fields]
+        candidates = np.flatnonzero(full_enrollment_df[fields[0]].isin(group[fields[0]].unique()).to_numpy() & ~mask)
+        if len(fields) > 1 and len(candidates):
+            keys = pd.MultiIndex.from_frame(group.astype(str))
+            rows = pd.MultiIndex.from_frame(full_enrollment_df[fields].iloc[candidates].astype(str))
+            candidates = candidates[rows.isin(keys)]
+        mask[candidates] = True
+    return mask
+
+@instrumented('apply_overrides')
+def apply_overrides(full_enrollment_df, override_file_path, term_map=None, merge_map=None):
+    """
+    Apply override.csv to the formatted enrollment table.
+
+    Each row is an add (the default) or, with action=drop, a removal. Adds replace any enrollment
+    for the same user and course. Drops match on user_id, course_id and term_id, where a blank or
+    "*" field matches anything: a user_id alone removes the user everywhere, a term_id alone empties the term.
+    Drops are applied before adds, so an add can re-enroll someone a broader drop removed.
+
+    Args:
+        full_enrollment_df (pd.DataFrame): Enrollments with formatted u/c IDs.
+        override_file_path (str): Path to override.csv; skipped when it does not exist.
+        term_map (dict): Raw course ID to term, used for add rows without a term_id.
+        merge_map (dict): Raw course ID to merge code, so raw IDs land on the merged course.
+
+    Returns:
+        pd.DataFrame: Enrollments with the overrides applied.
+    """
+    if not os.path.exists(override_file_path):
+        print(f"No override file found at {override_file_path}. Skipping overrides.")
+        return full_enrollment_df
+
+    rules = _valid_rules(normalize_rules(read_export(override_file_path), term_map, merge_map))
+    adds = rules[rules['action'] == 'add'].drop_duplicates(subset=['user_id', 'course_id'], keep='last')
+    drops = rules[rules['action'] == 'drop']
+
+    # Replaced pairs are matched exactly on user and course, whatever the add's term
+    removed = match_rules(full_enrollment_df, drops) | match_rules(full_enrollment_df, adds[['user_id', 'course_id']].assign(term_id=np.nan))
+    adds = adds.reindex(columns=full_enrollment_df.columns)
+    if 'status' in adds.columns:
+        adds['status'] = adds['status'].fillna('active')
+    full_enrollment_df = append_enrollments(full_enrollment_df[~removed], adds)
+    print(f"Overrides applied from {override_file_path}: {removed.sum()} enrollments removed or replaced, {len(adds)} added")
+    return full_enrollment_df
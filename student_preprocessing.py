@@ -1,28 +1,86 @@
+import numpy as np
 import pandas as pd
-from file_handling import load_and_combine_csv
-
-def preprocess_enrollment_data(file_path):
-    """Preprocesses enrollment data from a CSV file."""
-    df = load_and_combine_csv(file_path)
-    current_course = {"name": None, "id": None, "subject": None}
-    processed_rows = []
-
-    for _, row in df.iterrows():
-        if pd.notna(row.iloc[1]) and pd.notna(row.iloc[2]):
-            current_course = {
-                "name": row.iloc[0],
-                "id": str(int(row.iloc[1])),
-                "subject": row.iloc[2]
-            }
-        elif pd.notna(row.iloc[3]) and pd.notna(row.iloc[5]):
-            processed_rows.append({
-                "course_name": current_course["name"],
-                "course_id": current_course["id"],
-                "subject": current_course["subject"],
-                "name": row.iloc[3],
-                "user_id": str(int(row.iloc[5]))
-            })
-
-    processed_df = pd.DataFrame(processed_rows)
+from course_preprocessing import plain_ids
+from file_handling import load_and_combine_csv, iter_csv_chunks, map_csv_parallel, read_export
+
+def _stripped_ids(values):
+    """IDs as written in the export; they are read as strings, so only stray spaces need removing."""
+    return values.str.strip()
+
+def _with_previous(values, previous):
+    """Prefix a course column with the course carried over from before this block of rows."""
+    return np.concatenate([np.array([previous], dtype=object), values.to_numpy(dtype=object)])
+
+def _parse_enrollment_rows(df, current_course):
+    """Parse one block of the student list export, starting under current_course."""
+    # Course header rows carry an ID and subject; student rows carry a name and student ID
+    is_course = (df.iloc[:, 1].notna() & df.iloc[:, 2].notna()).to_numpy()
+    is_student = ~is_course & (df.iloc[:, 3].notna() & df.iloc[:, 5].notna()).to_numpy()
+
+    # Each student belongs to the closest course header above it; 0 is the carried-over course
+    course_number = np.cumsum(is_course)[is_student]
+    courses = df.loc[is_course]
+    students = df.loc[is_student]
+    course_columns = [
+        _with_previous(courses.iloc[:, 0], current_course[0]),
+        # Course IDs are written the way the catalogue keys them, so "0100" in an export finds course 100
+        _with_previous(plain_ids(_stripped_ids(courses.iloc[:, 1])), current_course[1]),
+        _with_previous(courses.iloc[:, 2], current_course[2]),
+    ]
+
+    processed_df = pd.DataFrame({
+        "course_name": course_columns[0][course_number],
+        "course_id": course_columns[1][course_number],
+        "subject": course_columns[2][course_number],
+        "name": students.iloc[:, 3].to_numpy(dtype=object),
+        "user_id": _stripped_ids(students.iloc[:, 5]).to_numpy(dtype=object),
+    })
+    return processed_df, tuple(column[-1] for column in course_columns)
+
+def preprocess_enrollment_file(file):
+    """
+    Parse a single student list export; runs in a worker process for parallel loading.
+    Returns the rows, with no course for students listed before the file's first course header, and the file's last course.
+    """
+    return _parse_enrollment_rows(read_export(file), (None, None, None))
+
+def _carry_courses(parsed_files):
+    """
+    Join files parsed separately, giving students listed before a file's first course header
+    the last course of the files before it, as a combined or chunked read does.
+    """
+    current_course = (None, None, None)
+    processed = []
+    for processed_df, last_course in parsed_files:
+        # Course headers always carry an ID, so rows without one sit under the carried-over course
+        carried = processed_df['course_id'].isna().to_numpy()
+        if carried.any():
+            processed_df.loc[carried, ['course_name', 'course_id', 'subject']] = current_course
+        if last_course[1] is not None:
+            current_course = last_course
+        processed.append(processed_df)
+    return pd.concat(processed, ignore_index=True)
+
+def preprocess_enrollment_data(file_path, chunksize=None, workers=None):
+    """
+    Preprocesses enrollment data from a CSV file.
+    With workers, each export file is parsed in its own worker process; otherwise
+    with chunksize, the files are streamed in chunks of at most that many rows.
+    """
+    if workers:
+        processed_df = _carry_courses(map_csv_parallel(file_path, preprocess_enrollment_file, workers))
+    else:
+        if chunksize:
+            chunks = iter_csv_chunks(file_path, chunksize)
+        else:
+            chunks = [load_and_combine_csv(file_path)]
+
+        current_course = (None, None, None)
+        processed = []
+        for chunk in chunks:
+            rows, current_course = _parse_enrollment_rows(chunk, current_course)
+            processed.append(rows)
+        processed_df = pd.concat(processed, ignore_index=True)
+
     processed_df['role'] = 'student'
-    return processed_df
\ No newline at end of file
+    return processed_df
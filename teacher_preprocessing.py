@@ -1,26 +1,54 @@
 import pandas as pd
-from file_handling import load_and_combine_csv, load_csv
+import os
+from course_preprocessing import plain_ids
+from file_handling import load_and_combine_csv, iter_csv_chunks, preprocess_csv_parallel, read_export, CACHE_DIR
+from teacher_resolver import load_name_index, resolve_names
 
 def melt_teachers(df):
-    df.dropna(axis=1, how='all', inplace=True)
+    # Skip columns where all entries are NaN which may result from extra commas in the CSV
     teacher_columns = df.columns[df.columns.get_loc("teacher"):]
-    melted_df = df.melt(id_vars=["course_name", "course_id", "subject"], value_vars=teacher_columns, var_name="Teacher Role", value_name="name")
-    melted_df = melted_df.dropna(subset=["name"])
-    return melted_df[["course_name", "course_id", "subject", "name"]]
+    teacher_columns = teacher_columns[df[teacher_columns].notna().any().to_numpy()]
+    melted_df = df.melt(id_vars=["course_name", "course_id", "subject"], value_vars=teacher_columns, var_name="Teacher Role", value_name="name", ignore_index=False)
+    # Keep each course's teachers together in export order, so combined, chunked and per-file parsing agree
+    melted_df = melted_df.dropna(subset=["name"]).sort_index(kind="stable")
+    return melted_df[["course_name", "course_id", "subject", "name"]].reset_index(drop=True)
 
-def map_teacher_ids(teacher_df, id_df):
-    id_df['fullname'] = id_df['SURNAME'] + ', ' + id_df['NAME']
-    id_map = id_df.set_index('fullname')['USER ID'].to_dict()
-    teacher_df['user_id'] = teacher_df['name'].map(id_map)
-    teacher_df['user_id'] = teacher_df['user_id'].apply(lambda x: str(int(x)) if pd.notna(x) else x)
-    return teacher_df
+def melt_teacher_file(file):
+    # Melt a single teacher export; runs in a worker process for parallel loading
+    return melt_teachers(read_export(file))
 
-def preprocess_teacher_enrollments(file_path):
-    df = load_and_combine_csv(file_path)
-    formatted_df = melt_teachers(df)
-    teacher_ids_df = load_csv('temp_inputs/teacher_ids.csv')
-    mapped_df = map_teacher_ids(formatted_df, teacher_ids_df)
-    mapped_df['user_id'] = mapped_df['user_id'].astype(str)
-    mapped_df['course_id'] = mapped_df['course_id'].astype(str)
+def map_teacher_ids(teacher_df, name_index):
+    # Resolve names through the normalized index, falling back to fuzzy matching
+    teacher_df['user_id'], report_df = resolve_names(teacher_df['name'], name_index)
+    # Unresolved names are reported for review instead of emitting "nan" user IDs
+    return teacher_df.dropna(subset=['user_id']), report_df
+
+def write_teacher_report(report_df, report_path='temp_outputs/unresolved_teachers.csv'):
+    # Report fuzzy matches and unresolved names, and remove a report left by an earlier run once every name resolves
+    if not report_df.empty:
+        os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+        report_df.to_csv(report_path, index=False)
+        unresolved = (report_df['status'] == 'unresolved').sum()
+        print(f"{len(report_df) - unresolved} teacher names fuzzy matched, {unresolved} unresolved. See {report_path}")
+    elif os.path.exists(report_path):
+        os.remove(report_path)
+
+def preprocess_teacher_enrollments(file_path, chunksize=None, workers=None, teacher_ids_path='temp_inputs/teacher_ids.csv', cache_dir=CACHE_DIR):
+    """
+    Parse the teacher exports and resolve each teacher's user ID.
+
+    Returns:
+        tuple: The teacher enrollments and the fuzzy-matched or unresolved names, for write_teacher_report.
+            The report is returned rather than written so a cached parse reports it again.
+    """
+    if workers:
+        formatted_df = preprocess_csv_parallel(file_path, melt_teacher_file, workers)
+    elif chunksize:
+        formatted_df = pd.concat([melt_teachers(chunk) for chunk in iter_csv_chunks(file_path, chunksize)], ignore_index=True)
+    else:
+        formatted_df = melt_teachers(load_and_combine_csv(file_path))
+    name_index = load_name_index(teacher_ids_path, cache_dir)
+    mapped_df, report_df = map_teacher_ids(formatted_df, name_index)
+    mapped_df['course_id'] = plain_ids(mapped_df['course_id']).astype(str)
     mapped_df['role'] = 'teacher'
-    return mapped_df
\ No newline at end of file
+    return mapped_df, report_df
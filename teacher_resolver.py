@@ -0,0 +1,143 @@
+import pandas as pd
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from file_handling import load_cached, load_csv, hash_files, CACHE_DIR
+
+# Minimum edit similarity for a fuzzy match to be accepted without review
+FUZZY_THRESHOLD = 0.85
+# A fuzzy match must also beat the best candidate for another person by this much
+FUZZY_MARGIN = 0.05
+MAX_CANDIDATES = 3
+# Number of trigram-overlap leaders rescored by edit similarity
+SHORTLIST_SIZE = 20
+# Staff exports and name indexes loaded by this process, keyed by staff export path and contents
+_staff = {}
+_name_indexes = {}
+
+def normalize_names(names):
+    """Normalize names for matching: strip accents, ignore case, and treat commas, hyphens and extra spaces alike."""
+    return (
+        names.astype(str)
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore')
+        .str.decode('ascii')
+        .str.casefold()
+        .str.replace(r'[^a-z0-9]+', ' ', regex=True)
+        .str.strip()
+    )
+
+def _trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def build_name_index(id_df):
+    """
+    Build the teacher name index from the staff export.
+
+    Args:
+        id_df (pd.DataFrame): Staff export with SURNAME, NAME and USER ID columns.
+
+    Returns:
+        dict: Exact lookups from normalized "surname, name" keys to user IDs, plus a
+            trigram index over the keys for fuzzy lookups. Keys shared by people with
+            different IDs are kept out of the exact lookup as ambiguous.
+    """
+    id_df = id_df.dropna(subset=['USER ID'])
+    keys = normalize_names(id_df['SURNAME'] + ', ' + id_df['NAME'])
+    user_ids = id_df['USER ID'].astype('int64').astype(str)
+
+    exact = {}
+    ambiguous = set()
+    for key, user_id in zip(keys, user_ids):
+        if exact.get(key, user_id) != user_id:
+            ambiguous.add(key)
+        exact[key] = user_id
+    for key in ambiguous:
+        del exact[key]
+
+    names = list(dict.fromkeys(zip(keys, user_ids)))
+    trigrams = defaultdict(list)
+    gram_counts = []
+    for position, (key, _) in enumerate(names):
+        grams = _trigrams(key)
+        gram_counts.append(len(grams))
+        for gram in grams:
+            trigrams[gram].append(position)
+    return {'exact': exact, 'names': names, 'gram_counts': gram_counts, 'trigrams': dict(trigrams)}
+
+def load_staff(teacher_ids_path):
+    """Load a staff export, parsed once per version of the file and kept in memory like the name index."""
+    key = (teacher_ids_path, hash_files([teacher_ids_path]))
+    if key not in _staff:
+        _staff[key] = load_csv(teacher_ids_path)
+    return _staff[key]
+
+def load_name_index(teacher_ids_path, cache_dir=CACHE_DIR):
+    """
+    Load the name index for a staff export, rebuilt only when the export changes.
+    Loaded indexes are kept in memory, so batch workers forked after the first load share it.
+    """
+    key = (teacher_ids_path, hash_files([teacher_ids_path]))
+    if key not in _name_indexes:
+        _name_indexes[key] = load_cached('teacher_index', [teacher_ids_path], lambda: build_name_index(load_staff(teacher_ids_path)), cache_dir=cache_dir)
+    return _name_indexes[key]
+
+def fuzzy_candidates(name_index, key, limit=MAX_CANDIDATES):
+    """
+    Return up to limit (key, user_id, score) candidates for a name key, best first.
+    The trigram index shortlists keys by Jaccard similarity; the shortlist is then scored by edit similarity.
+    """
+    grams = _trigrams(key)
+    shared = Counter()
+    for gram in grams:
+        shared.update(name_index['trigrams'].get(gram, ()))
+    jaccard = [
+        (count / (len(grams) + name_index['gram_counts'][position] - count), position)
+        for position, count in shared.items()
+    ]
+    shortlist = sorted(jaccard, reverse=True)[:SHORTLIST_SIZE]
+
+    scored = []
+    for _, position in shortlist:
+        candidate, user_id = name_index['names'][position]
+        scored.append((round(SequenceMatcher(None, key, candidate).ratio(), 3), candidate, user_id))
+    scored.sort(reverse=True)
+    return [(candidate, user_id, score) for score, candidate, user_id in scored[:limit]]
+
+def resolve_names(names, name_index, threshold=FUZZY_THRESHOLD):
+    """
+    Resolve teacher names to user IDs: exact normalized lookups first, then fuzzy matching for the misses.
+
+    Args:
+        names (pd.Series): Names as they appear in the teacher export ("Surname, Name").
+        name_index (dict): Index from build_name_index.
+        threshold (float): Minimum similarity for accepting a clear fuzzy match.
+
+    Returns:
+        tuple: A tuple containing:
+            - pd.Series: User ID for each name, NaN where the name could not be resolved.
+            - pd.DataFrame: One row per fuzzy-matched or unresolved name, with its candidates.
+    """
+    keys = normalize_names(names)
+    user_ids = keys.map(name_index['exact'])
+
+    fuzzy_matches = {}
+    report = []
+    misses = pd.DataFrame({'name': names, 'key': keys})[user_ids.isna()].drop_duplicates('key')
+    for name, key in zip(misses['name'], misses['key']):
+        candidates = fuzzy_candidates(name_index, key)
+        best = candidates[0] if candidates else None
+        runner_up = next((score for _, user_id, score in candidates if user_id != best[1]), 0) if best else 0
+        clear = best is not None and best[2] >= threshold and best[2] - runner_up >= FUZZY_MARGIN
+        if clear:
+            fuzzy_matches[key] = best[1]
+        report.append({
+            'name': name,
+            'status': 'fuzzy' if clear else 'unresolved',
+            'user_id': best[1] if clear else None,
+            'candidates': '; '.join(f"{candidate} ({user_id}, {score})" for candidate, user_id, score in candidates),
+        })
+
+    if fuzzy_matches:
+        user_ids = user_ids.fillna(keys.map(fuzzy_matches))
+    return user_ids, pd.DataFrame(report, columns=['name', 'status', 'user_id', 'candidates'])
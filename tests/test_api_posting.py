@@ -0,0 +1,110 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import api_posting
+from api_posting import post_csvs_concurrently, post_zip_and_wait, MAX_RETRY_AFTER
+
+class StubCanvas(BaseHTTPRequestHandler):
+    """Answers from the server's scripted responses, then accepts every import and reports it imported."""
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        with server.lock:
+            server.requests.append(('POST', self.path))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            scripted = server.post_responses.pop(0) if server.post_responses else None
+        threading.Event().wait(server.post_delay)
+        with server.lock:
+            server.in_flight -= 1
+        self.reply(*(scripted or (200, {}, {'id': len(server.requests), 'workflow_state': 'created'})))
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(('GET', self.path))
+            scripted = server.get_responses.pop(0) if server.get_responses else None
+        self.reply(*(scripted or (200, {}, {'id': 1, 'workflow_state': 'imported'})))
+
+    def reply(self, status, headers, body):
+        payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def canvas():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubCanvas)
+    server.lock = threading.Lock()
+    server.requests, server.post_responses, server.get_responses = [], [], []
+    server.in_flight = server.max_in_flight = 0
+    server.post_delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(api_posting.time, 'sleep', delays.append)
+    return delays
+
+def url(server):
+    return f'http://127.0.0.1:{server.server_port}'
+
+@pytest.fixture
+def csv_file(tmp_path):
+    file_path = tmp_path / 'enrollments.csv'
+    file_path.write_text('course_id,user_id,role,status\nc000100,u000001,student,active\n')
+    return str(file_path)
+
+def test_throttled_and_failed_posts_are_retried_after_the_servers_delay(canvas, sleeps, csv_file):
+    canvas.post_responses = [
+        (503, {'Retry-After': '2'}, 'busy'),
+        (429, {'Retry-After': '100000'}, 'slow down'),
+        (403, {}, '403 Forbidden (Rate Limit Exceeded)'),
+    ]
+    result = post_csvs_concurrently([csv_file], 'token', url(canvas), '1', poll_interval=0)[csv_file]
+
+    assert result['workflow_state'] == 'imported'
+    assert [method for method, _ in canvas.requests] == ['POST'] * 4 + ['GET']
+    assert sleeps[:3] == [2.0, MAX_RETRY_AFTER, 4.0]
+
+def test_polling_waits_for_a_finished_state(canvas, sleeps, csv_file):
+    canvas.get_responses = [(200, {}, {'id': 1, 'workflow_state': 'created'}), (200, {}, {'id': 1, 'workflow_state': 'importing'})]
+    result = post_csvs_concurrently([csv_file], 'token', url(canvas), '1', poll_interval=0)[csv_file]
+
+    assert result['workflow_state'] == 'imported'
+    assert [method for method, _ in canvas.requests] == ['POST', 'GET', 'GET', 'GET']
+    assert canvas.requests[1][1] == '/api/v1/accounts/1/sis_imports/1'
+
+def test_rejected_posts_are_reported_not_posted(canvas, sleeps, csv_file):
+    canvas.post_responses = [(401, {}, 'Invalid access token')]
+    result = post_csvs_concurrently([csv_file], 'token', url(canvas), '1', poll_interval=0)[csv_file]
+    assert result == {'workflow_state': 'not_posted', 'status_code': 401, 'message': 'Invalid access token'}
+
+    canvas.post_responses = [(400, {}, 'bad zip')]
+    assert post_zip_and_wait(b'zip', 'token', url(canvas), '1', poll_interval=0)['workflow_state'] == 'not_posted'
+
+def test_no_more_than_max_concurrency_imports_are_in_flight(canvas, tmp_path):
+    canvas.post_delay = 0.05
+    file_paths = []
+    for term in range(6):
+        file_path = tmp_path / f'enrollments_{term}.csv'
+        file_path.write_text('course_id,user_id\n')
+        file_paths.append(str(file_path))
+
+    results = post_csvs_concurrently(file_paths, 'token', url(canvas), '1', max_concurrency=2, poll_interval=0)
+
+    assert list(results) == file_paths
+    assert all(result['workflow_state'] == 'imported' for result in results.values())
+    assert canvas.max_in_flight <= 2
@@ -0,0 +1,51 @@
+import json
+import pytest
+from batch_runner import load_manifest, school_args, school_credentials
+
+def write_manifest(tmp_path, manifest):
+    manifest_path = tmp_path / 'batch' / 'schools.json'
+    manifest_path.parent.mkdir()
+    manifest_path.write_text(json.dumps(manifest))
+    return str(manifest_path)
+
+def test_paths_resolve_against_the_manifest_and_each_school_root(tmp_path):
+    manifest_path = write_manifest(tmp_path, {
+        'teacher_ids': 'shared/teacher_ids.csv',
+        'defaults': {'all_terms': True, 'report': 'run.json'},
+        'max_workers': 2,
+        'schools': [
+            {'name': 'north', 'root': 'sites/north', 'input_root': 'exports', 'bundle': True},
+            {'name': 'south', 'teacher_ids': 'south_staff.csv', 'all_terms': False, 'terms': ['T1']},
+        ],
+    })
+    schools, teacher_ids, max_workers = load_manifest(manifest_path)
+    base_dir = tmp_path / 'batch'
+    north, south = schools
+
+    assert teacher_ids == str(base_dir / 'shared' / 'teacher_ids.csv') and max_workers == 2
+    assert north['input_root'] == str(base_dir / 'sites' / 'north' / 'exports')
+    assert north['output_root'] == str(base_dir / 'sites' / 'north' / 'temp_outputs')
+    assert north['cache_dir'] == str(base_dir / 'sites' / 'north' / 'temp_cache')
+    assert north['report'] == str(base_dir / 'sites' / 'north' / 'run.json')
+    assert north['teacher_ids'] == teacher_ids
+    # A school without a root is rooted at its name; its own staff export is taken from there
+    assert south['stage_dir'] == str(base_dir / 'south' / 'temp_stages')
+    assert south['teacher_ids'] == str(base_dir / 'south' / 'south_staff.csv')
+
+    north_args, south_args = school_args(north), school_args(south)
+    assert north_args.bundle and north_args.all_terms and not north_args.dry_run
+    assert not south_args.all_terms and south_args.terms == ['T1']
+
+def test_unknown_options_are_rejected_before_any_school_runs(tmp_path):
+    manifest_path = write_manifest(tmp_path, {'schools': [{'name': 'north'}, {'name': 'south', 'dryrun': True}]})
+    with pytest.raises(ValueError, match='School south: unknown options dryrun'):
+        load_manifest(manifest_path)
+
+def test_school_credentials_fall_back_to_the_canvas_variables():
+    environ = {'CANVAS_API_TOKEN': 'shared', 'CANVAS_URL': 'https://all.example', 'CANVAS_ACCOUNT_ID': '1', 'NORTH_TOKEN': 'north'}
+    assert school_credentials({'name': 'south'}, environ) == {'CANVAS_API_TOKEN': 'shared', 'CANVAS_URL': 'https://all.example', 'CANVAS_ACCOUNT_ID': '1'}
+    assert school_credentials({'name': 'north', 'token_env': 'NORTH_TOKEN', 'canvas_url': 'https://north.example', 'canvas_account_id': 7}, environ) == {
+        'CANVAS_API_TOKEN': 'north', 'CANVAS_URL': 'https://north.example', 'CANVAS_ACCOUNT_ID': '7',
+    }
+    # A token variable that is not set leaves the school without a token rather than borrowing the shared one
+    assert school_credentials({'name': 'east', 'token_env': 'EAST_TOKEN'}, environ)['CANVAS_API_TOKEN'] is None
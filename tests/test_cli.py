@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+import cli
+from file_handling import save_stage
+
+ENROLLMENTS = pd.DataFrame({
+    'course_name': ['Maths', 'Maths', 'Art'],
+    'course_id': ['c100001', 'c100001', 'c100002'],
+    'subject': ['MA', 'MA', 'AR'],
+    'name': ['Lee, Kim', 'Smith, Anna', 'Lee, Kim'],
+    'user_id': ['u000001', 'u000101', 'u000001'],
+    'role': ['student', 'teacher', 'student'],
+    'term_id': ['T1', 'T1', 'T2'],
+    'status': ['active', 'active', 'active'],
+})
+COURSES = pd.DataFrame({
+    'long_name': ['Maths', 'Art'], 'short_name': ['MA', 'AR'], 'status': ['active', 'active'],
+    'course_id': ['c100001', 'c100002'], 'account_id': ['1', '1'], 'term_id': ['T1', 'T2'],
+    'blueprint_course_id': [None, None], 'CANVAS_NEEDED': ['Y', 'Y'],
+})
+
+def parse_args(tmp_path, *argv):
+    return cli.build_parser().parse_args([*argv, '--output-root', str(tmp_path / 'out'), '--stage-dir', str(tmp_path / 'stages')])
+
+@pytest.fixture
+def stored_stages(tmp_path):
+    save_stage(ENROLLMENTS, 'enrollments', str(tmp_path / 'stages'))
+    save_stage(COURSES, 'courses', str(tmp_path / 'stages'))
+
+def test_select_terms_picks_requested_terms_and_warns_about_unknown_ones(tmp_path, capsys):
+    assert cli.select_terms(parse_args(tmp_path, '--all-terms'), ['T1', 'T2']) == ['T1', 'T2']
+    assert cli.select_terms(parse_args(tmp_path, '--terms', 'T2', 'T9'), ['T1', 'T2']) == ['T2']
+    assert 'term T9 has no enrollments' in capsys.readouterr().out
+    assert cli.select_terms(parse_args(tmp_path), ['T1', 'T2']) == []
+
+def test_write_runs_on_its_own_from_stored_stage_tables(tmp_path, stored_stages):
+    assert cli.run_stages(parse_args(tmp_path, '--stages', 'write', '--terms', 'T1')) == 0
+    output_root = tmp_path / 'out'
+    assert pd.read_csv(output_root / 'enrollments_T1' / 'enrollments.csv')['user_id'].tolist() == ['u000001', 'u000101']
+    assert (output_root / 'enrollments_T2' / 'enrollments.csv').exists()
+    assert pd.read_csv(output_root / 'courses.csv')['course_id'].tolist() == ['c100001', 'c100002']
+    assert cli.written_terms(str(output_root)) == ['T1', 'T2']
+
+def test_dry_run_never_posts(tmp_path, stored_stages, monkeypatch, capsys):
+    def post(*args):
+        raise AssertionError('a dry run posted')
+    monkeypatch.setattr(cli, 'post', post)
+
+    assert cli.run_stages(parse_args(tmp_path, '--stages', 'write', 'post', '--all-terms', '--dry-run')) == 0
+    assert capsys.readouterr().out.count('Dry run: would post') == 2
+    # The post stage on its own picks up the files the write stage left
+    assert cli.run_stages(parse_args(tmp_path, '--stages', 'post', '--terms', 'T2', '--dry-run')) == 0
+    [line] = [line for line in capsys.readouterr().out.splitlines() if line.startswith('Dry run')]
+    assert line.endswith('enrollments.csv (1 rows) for term T2')
+
+def test_users_without_login_id_exit_with_code_2(tmp_path, capsys):
+    assert cli.run(parse_args(tmp_path, '--users', '--all-terms')) == 2
+    assert '--users needs --login-id' in capsys.readouterr().out
+    assert not (tmp_path / 'stages').exists()
+
+def test_post_with_nothing_written_returns_before_importing_the_pipeline(tmp_path):
+    code = (
+        "import sys, cli\n"
+        "args = cli.build_parser().parse_args(['--stages', 'post', '--all-terms', '--output-root', 'out'])\n"
+        "print(cli.run_stages(args), 'main' in sys.modules, 'pandas' in sys.modules)\n"
+    )
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, capture_output=True, text=True, check=True, env={**os.environ, 'PYTHONPATH': repo_root})
+    assert result.stdout.splitlines() == ['No terms selected. Nothing to post.', '0 False False']
@@ -0,0 +1,41 @@
+import os
+import pandas as pd
+from course_catalogue import merge_course_export, load_catalogue
+from course_preprocessing import update_and_save_courses
+
+def export(*rows, columns=('MS_COURSE_ID', 'COURSE_LABEL', 'CANVAS_NEEDED', 'term_id', 'long_name')):
+    return pd.DataFrame(list(rows), columns=list(columns), dtype=object)
+
+def catalogue():
+    first = export(['100', 'MATH', 'Y', 'T1', 'Maths 10'], ['200', 'ART', 'Y', 'T2', 'Art 10'])
+    return merge_course_export(load_catalogue('missing.parquet'), first).set_index('MS_COURSE_ID')
+
+def test_plain_exports_keep_manual_values_and_missing_courses():
+    merged = merge_course_export(catalogue().reset_index(), export(['100', 'MATHS', None, None, None])).set_index('MS_COURSE_ID')
+    assert merged.loc['100', ['COURSE_LABEL', 'term_id', 'long_name']].tolist() == ['MATHS', 'T1', 'Maths 10']
+    assert merged.loc['200', 'CANVAS_NEEDED'] == 'Y'
+
+def test_a_dash_clears_a_manual_value():
+    merged = merge_course_export(catalogue().reset_index(), export(['100', 'MATH', None, 'T3', '-'])).set_index('MS_COURSE_ID')
+    assert merged.loc['100', 'term_id'] == 'T3'
+    assert pd.isna(merged.loc['100', 'long_name'])
+    assert merged.loc['200', 'long_name'] == 'Art 10'
+
+def test_full_exports_retire_missing_courses():
+    merged = merge_course_export(catalogue().reset_index(), export(['100', 'MATH', None, None, None]), retire_missing=True).set_index('MS_COURSE_ID')
+    assert merged['CANVAS_NEEDED'].to_dict() == {'100': 'Y', '200': 'N'}
+
+def test_courses_delta_is_only_written_against_a_snapshot(tmp_path):
+    courses_df = pd.DataFrame({
+        'CANVAS_NEEDED': ['Y', 'Y'], 'long_name': ['Maths', 'Art'], 'short_name': ['M', 'A'], 'status': ['active', 'active'],
+        'course_id': ['c000100', 'c000200'], 'account_id': ['1', '1'], 'term_id': ['T1', 'T2'], 'blueprint_course_id': [None, None],
+    })
+    file_path = str(tmp_path / 'courses.csv')
+    delta_path = tmp_path / 'courses_delta.csv'
+
+    delta_df = update_and_save_courses(courses_df, file_path, courses_df.iloc[:1].drop(columns='CANVAS_NEEDED'))
+    assert delta_df['course_id'].tolist() == ['c000200']
+    assert delta_path.exists()
+
+    assert len(update_and_save_courses(courses_df, file_path)) == 2
+    assert not os.path.exists(delta_path)
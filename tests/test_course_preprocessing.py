@@ -0,0 +1,40 @@
+import pandas as pd
+from course_preprocessing import format_course_data, update_enrollments
+from overrides import normalize_rules
+from student_preprocessing import preprocess_enrollment_data
+from teacher_preprocessing import preprocess_teacher_enrollments
+
+COURSES = pd.DataFrame({
+    'MS_COURSE_ID': ['100', '200'],
+    'MERGE_CODE': [None, '100'],
+    'CANVAS_NEEDED': ['Y', 'Y'],
+    'term_id': ['T1', 'T1'],
+}, dtype=object)
+
+def test_zero_padded_export_course_ids_find_their_catalogue_course(tmp_path):
+    (tmp_path / 'students.csv').write_text(
+        'course_name,course_id,subject,name,,student_id\n'
+        'Maths,0100,MA,,,\n'
+        ',,,"Lee, Kim",,12\n'
+        'Maths B,0200,MA,,,\n'
+        ',,,"Ng, Zoe",,34\n'
+    )
+    students = preprocess_enrollment_data(str(tmp_path))
+    _, term_map, merge_map = format_course_data(COURSES.copy())
+
+    updated = update_enrollments(students, COURSES, term_map, merge_map)
+
+    assert updated[['course_id', 'user_id', 'term_id']].values.tolist() == [['100', '12', 'T1'], ['100', '34', 'T1']]
+
+def test_override_course_ids_are_normalized_the_same_way():
+    _, term_map, merge_map = format_course_data(COURSES.copy())
+    rules = normalize_rules(pd.DataFrame({'user_id': ['12'], 'course_id': ['0200']}, dtype=object), term_map, merge_map)
+    assert rules[['course_id', 'term_id']].values.tolist() == [['c000100', 'T1']]
+
+def test_teacher_course_ids_are_normalized_the_same_way(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The staff name index is cached under the working directory
+    (tmp_path / 'teacher_enroll').mkdir()
+    (tmp_path / 'teacher_enroll' / 'teachers.csv').write_text('course_name,course_id,subject,teacher\nMaths,0100,MA,"Smith, Anna"\n')
+    (tmp_path / 'teacher_ids.csv').write_text('SURNAME,NAME,USER ID\nSmith,Anna,101\n')
+    teachers, _ = preprocess_teacher_enrollments('teacher_enroll', teacher_ids_path='teacher_ids.csv')
+    assert teachers[['course_id', 'user_id']].values.tolist() == [['100', '101']]
@@ -0,0 +1,104 @@
+import os
+import stat
+import time
+import pandas as pd
+import pytest
+import file_handling
+from file_handling import read_export, iter_export_chunks, write_csv_atomic, save_stage, load_stage, load_cached, evict_cache, atomic_write, _source_version
+from student_preprocessing import preprocess_enrollment_data
+
+STUDENT_LIST = (
+    'course_name,course_id,subject,name,,student_id\n'
+    'Maths,100,MA,,,\n'
+    ',,,"Lee, Kim",,0012\n'
+    ',,,"Ng, Zoe",,34\n'
+)
+# MySchool leaves a comma at the end of every row, one more cell than the header
+TRAILING_COMMAS = STUDENT_LIST.replace('\n', ',\n').replace('student_id,\n', 'student_id\n')
+
+def write_export(tmp_path, text, encoding='utf-8'):
+    (tmp_path / 'exports').mkdir()
+    file_path = tmp_path / 'exports' / 'students.csv'
+    file_path.write_bytes(text.encode(encoding))
+    return str(file_path)
+
+@pytest.mark.parametrize('text, encoding', [(STUDENT_LIST, 'utf-8-sig'), (TRAILING_COMMAS, 'utf-8'), (TRAILING_COMMAS, 'utf-8-sig')], ids=['bom', 'trailing-commas', 'trailing-commas-bom'])
+def test_eager_and_chunked_reads_agree(tmp_path, text, encoding):
+    file_path = write_export(tmp_path, text, encoding)
+    eager = read_export(file_path)
+    chunked = pd.concat(iter_export_chunks(file_path, 2), ignore_index=True)
+
+    assert list(eager.columns[:6]) == ['course_name', 'course_id', 'subject', 'name', 'Unnamed: 4', 'student_id']
+    assert eager['student_id'].tolist()[1:] == ['0012', '34']
+    pd.testing.assert_frame_equal(eager, chunked)
+
+    for chunksize in (None, 2):
+        students = preprocess_enrollment_data(os.path.dirname(file_path), chunksize)
+        assert students[['course_id', 'user_id']].values.tolist() == [['100', '0012'], ['100', '34']]
+
+def test_a_wider_row_after_the_first_keeps_its_cells(tmp_path):
+    file_path = write_export(tmp_path, STUDENT_LIST + ',,,"Brown, Sam",,56,extra\n')
+    eager = read_export(file_path)
+    assert eager['Unnamed: 6'].tolist()[-1] == 'extra'
+    pd.testing.assert_frame_equal(eager, pd.concat(iter_export_chunks(file_path, 1), ignore_index=True))
+
+def test_write_csv_atomic_gives_files_the_usual_mode(tmp_path):
+    file_path = tmp_path / 'enrollments.csv'
+    write_csv_atomic(pd.DataFrame({'user_id': ['u000001']}), str(file_path))
+    (tmp_path / 'plain.csv').write_text('')
+
+    assert stat.S_IMODE(os.stat(file_path).st_mode) == stat.S_IMODE(os.stat(tmp_path / 'plain.csv').st_mode)
+    assert file_path.read_text() == 'user_id\nu000001\n'
+    assert sorted(os.listdir(tmp_path)) == ['enrollments.csv', 'plain.csv']
+
+def test_a_failed_atomic_write_keeps_the_old_file_and_leaves_no_temp_file(tmp_path, monkeypatch):
+    file_path = tmp_path / 'users.parquet'
+    file_path.write_text('old')
+    def fail(temp_path):
+        with open(temp_path, 'w') as f:
+            f.write('partial')
+        raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        atomic_write(str(file_path), fail)
+    monkeypatch.setattr(pd.DataFrame, 'to_feather', lambda df, temp_path, **kwargs: fail(temp_path))
+    with pytest.raises(OSError):
+        save_stage(pd.DataFrame({'rows': [1]}), 'students', str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ['users.parquet']
+    assert file_path.read_text() == 'old'
+
+def test_stage_tables_round_trip_with_nan_blanks(tmp_path):
+    df = pd.DataFrame({
+        'user_id': pd.Series(['1', None], dtype=object),
+        'name': pd.Series(['Lee, Kim', None], dtype='string'),
+        'term_id': pd.Categorical(['T1', 'T1']),
+        'rows': [1, 2],
+    })
+    save_stage(df, 'students', str(tmp_path))
+    loaded = load_stage('students', str(tmp_path))
+
+    assert loaded['user_id'].tolist()[0] == '1' and pd.isna(loaded['user_id'][1])
+    assert loaded['name'][1] is not pd.NA and pd.isna(loaded['name'][1])
+    assert isinstance(loaded['term_id'].dtype, pd.CategoricalDtype)
+    assert loaded['rows'].tolist() == [1, 2]
+
+def test_evict_cache_removes_old_entries_then_the_least_recently_used(tmp_path):
+    now = time.time()
+    for name, age in [('old.pkl', 40), ('recent.pkl', 1), ('older_use.pkl', 2), ('newest.pkl', 0), ('notes.txt', 40)]:
+        (tmp_path / name).write_bytes(b'x' * 100)
+        os.utime(tmp_path / name, (now - age * 86400, now - age * 86400))
+
+    evict_cache(max_age=30 * 86400, max_bytes=250, cache_dir=str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ['newest.pkl', 'notes.txt', 'recent.pkl']
+
+def test_cache_entries_are_rebuilt_when_the_source_version_changes(tmp_path, monkeypatch):
+    input_path = tmp_path / 'courses.csv'
+    input_path.write_text('MS_COURSE_ID\n100\n')
+    builds = []
+    def load():
+        return load_cached('courses', [str(input_path)], lambda: builds.append(1) or len(builds), cache_dir=str(tmp_path / 'cache'))
+
+    assert (load(), load()) == (1, 1)
+    assert _source_version(['file_handling.py']) != _source_version(['course_preprocessing.py'])
+    monkeypatch.setattr(file_handling, 'CACHE_VERSION', _source_version(['course_preprocessing.py']))
+    assert load() == 2
@@ -0,0 +1,57 @@
+import os
+import pandas as pd
+from incremental_sync import diff_enrollments, diff_courses, load_snapshot, save_snapshot, snapshot_terms
+from main import list_terms, save_enrollments_by_term
+
+COLUMNS = ['course_id', 'user_id', 'role', 'status']
+
+def enrollments(*rows):
+    return pd.DataFrame(list(rows), columns=COLUMNS, dtype=object)
+
+def test_diff_enrollments_sends_new_changed_and_dropped_rows():
+    previous = enrollments(['c1', 'u1', 'student', 'active'], ['c1', 'u2', 'student', 'active'], ['c2', 'u1', 'student', 'active'])
+    current = enrollments(['c1', 'u1', 'student', 'active'], ['c1', 'u2', 'student', 'inactive'], ['c3', 'u3', 'teacher', 'active'])
+
+    delta = diff_enrollments(current, previous)
+
+    assert delta.values.tolist() == [
+        ['c1', 'u2', 'student', 'inactive'],
+        ['c3', 'u3', 'teacher', 'active'],
+        ['c2', 'u1', 'student', 'deleted'],
+    ]
+
+def test_diff_enrollments_without_snapshot_sends_everything():
+    current = enrollments(['c1', 'u1', 'student', 'active'])
+    assert diff_enrollments(current, None) is current
+
+def test_diff_courses_ignores_unchanged_rows_and_blank_differences():
+    previous = pd.DataFrame({'course_id': ['c1', 'c2'], 'long_name': ['Maths', None], 'status': ['active', 'active']})
+    current = pd.DataFrame({'course_id': ['c1', 'c2', 'c3'], 'long_name': ['Maths 10', '', 'Art'], 'status': ['active', 'active', 'active']})
+
+    assert diff_courses(current, previous)['course_id'].tolist() == ['c1', 'c3']
+
+def test_snapshots_are_replaced_whole_and_removed_when_a_term_empties(tmp_path):
+    snapshot_dir = str(tmp_path)
+    save_snapshot(enrollments(['c1', 'u1', 'student', 'active']), 'T1', snapshot_dir)
+    save_snapshot(enrollments(['c2', 'u2', 'student', 'active']), 'T1', snapshot_dir)
+
+    assert load_snapshot('T1', snapshot_dir)['user_id'].tolist() == ['u2']
+    assert os.listdir(snapshot_dir) == ['enrollments_T1.parquet']
+    assert snapshot_terms(snapshot_dir) == ['T1']
+
+    save_snapshot(enrollments(), 'T1', snapshot_dir)
+    assert snapshot_terms(snapshot_dir) == []
+
+def test_term_with_no_enrollments_left_posts_its_drops(tmp_path):
+    output_root = str(tmp_path)
+    save_snapshot(enrollments(['c1', 'u1', 'student', 'active']), 'T1', os.path.join(output_root, 'snapshots'))
+    full_enrollment_df = enrollments(['c2', 'u2', 'student', 'active']).assign(subject='Art', term_id='T2')
+
+    terms = list_terms(full_enrollment_df, incremental=True, output_root=output_root)
+    uploads = save_enrollments_by_term(full_enrollment_df, terms, incremental=True, output_root=output_root)
+
+    assert terms == ['T1', 'T2']
+    upload_path, upload_df, subset = uploads['T1']
+    assert subset.empty
+    assert upload_df.values.tolist() == [['c1', 'u1', 'student', 'deleted']]
+    assert os.path.exists(upload_path)
@@ -0,0 +1,44 @@
+import json
+import pandas as pd
+import pytest
+import instrumentation
+from instrumentation import instrumented, measure, records, write_report
+
+@pytest.fixture(autouse=True)
+def fresh_records():
+    instrumentation.reset()
+    yield
+    instrumentation.reset()
+
+@instrumented('split')
+def split(df, other):
+    return df.iloc[:1], df.iloc[1:]
+
+def test_instrumented_records_rows_in_and_out():
+    df = pd.DataFrame({'user_id': ['u000001', 'u000002', 'u000003']})
+    split(df, df.iloc[:2])
+    [record] = records()
+    assert (record['stage'], record['rows_in'], record['rows_out']) == ('split', [3, 2], [1, 2])
+    assert record['wall_seconds'] >= 0
+
+def test_stage_memory_is_the_growth_during_the_stage():
+    with measure('allocate'):
+        block = bytearray(64 * 1024 * 1024)
+        block[::4096] = b'x' * len(block[::4096])  # Touch every page so it is resident
+    with measure('idle'):
+        pass
+    allocate, idle = records()
+    if allocate['rss_mib'] is None:
+        pytest.skip('/proc/self/statm is not available')
+    assert allocate['rss_growth_mib'] >= 60
+    assert abs(idle['rss_growth_mib']) < 60
+
+def test_write_report_writes_valid_json(tmp_path):
+    with measure('parse_students', rows_in=2) as record:
+        record['rows_out'] = 1
+    report_path = tmp_path / 'reports' / 'run.json'
+    write_report(str(report_path), terms=['T1'], started=pd.Timestamp('2024-01-01'))
+
+    report = json.loads(report_path.read_text())
+    assert report['terms'] == ['T1'] and report['started'] == '2024-01-01 00:00:00'
+    assert [(stage['stage'], stage['rows_in'], stage['rows_out']) for stage in report['stages']] == [('parse_students', 2, 1)]
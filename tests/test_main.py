@@ -0,0 +1,98 @@
+import io
+import os
+import zipfile
+import pandas as pd
+import pytest
+import main
+from file_handling import build_sis_zip
+from main import add_teachers_to_all_courses, post_sis_bundle
+
+COURSES = pd.DataFrame({
+    'course_id': ['c100001', 'c100002', 'c100003'],
+    'long_name': ['Maths', 'Art', 'Drama'],
+    'CANVAS_NEEDED': ['Y', None, 'N'],
+    'subject': ['MA', 'AR', 'DR'],
+    'term_id': ['T1', 'T2', 'T2'],
+}, dtype=object)
+ENROLLMENTS = pd.DataFrame({
+    'course_id': ['c100001', 'c100001'],
+    'user_id': ['u000101', 'u000001'],
+    'role': ['teacher', 'student'],
+}, dtype=object)
+
+def add_to_all(tmp_path, courses_df=COURSES):
+    teacher_list_file = tmp_path / 'add_to_all.csv'
+    # Exports from MySchool end every row with a comma
+    teacher_list_file.write_text('user_id,name,role,\nu000101,"Smith, Anna",teacher,\nu000102,"Lee, Kim",ta,\n')
+    result = add_teachers_to_all_courses(ENROLLMENTS.copy(), courses_df, str(teacher_list_file))
+    return result.iloc[len(ENROLLMENTS):]
+
+def test_listed_teachers_join_every_needed_course_once(tmp_path):
+    added = add_to_all(tmp_path)
+    # Blank CANVAS_NEEDED counts as needed, N is skipped, and u000101 already teaches c100001
+    assert added[['course_id', 'user_id', 'role', 'term_id', 'subject']].values.tolist() == [
+        ['c100001', 'u000102', 'ta', 'T1', 'MA'],
+        ['c100002', 'u000101', 'teacher', 'T2', 'AR'],
+        ['c100002', 'u000102', 'ta', 'T2', 'AR'],
+    ]
+    assert set(added['status']) == {'active'}
+
+def test_missing_subject_and_term_columns_are_left_blank(tmp_path):
+    added = add_to_all(tmp_path, COURSES.drop(columns=['subject', 'term_id']))
+    assert len(added) == 3
+    assert set(added['subject']) == {''} and set(added['term_id']) == {''}
+
+def test_a_missing_or_incomplete_list_changes_nothing(tmp_path, capsys):
+    assert add_teachers_to_all_courses(ENROLLMENTS, COURSES, str(tmp_path / 'add_to_all.csv')) is ENROLLMENTS
+    (tmp_path / 'add_to_all.csv').write_text('user_id,name\nu000101,"Smith, Anna"\n')
+    assert add_teachers_to_all_courses(ENROLLMENTS, COURSES, str(tmp_path / 'add_to_all.csv')) is ENROLLMENTS
+    assert "must contain 'user_id', 'name', and 'role'" in capsys.readouterr().out
+
+CANVAS_COURSES = COURSES.assign(short_name=['MA', 'AR', 'DR'], status='active', account_id='1', blueprint_course_id=None)
+USERS = pd.DataFrame({
+    'user_id': ['u000102'], 'login_id': ['102@school.example'], 'first_name': ['Kim'], 'last_name': ['Lee'],
+    'full_name': ['Kim Lee'], 'sortable_name': ['Lee, Kim'], 'status': ['active'],
+})
+
+def zip_members(zip_bytes):
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as archive:
+        return {name: pd.read_csv(archive.open(name), dtype=str) for name in archive.namelist()}
+
+@pytest.fixture
+def posted(monkeypatch):
+    """Stands in for Canvas: records each posted bundle and answers with the workflow state in posted.state."""
+    class Posted(list):
+        state = 'imported'
+    bundles = Posted()
+    def post_zip_and_wait(zip_bytes, token, canvas_url, account_id):
+        bundles.append(zip_members(zip_bytes))
+        return {'id': len(bundles), 'workflow_state': bundles.state}
+    monkeypatch.setattr(main, 'post_zip_and_wait', post_zip_and_wait)
+    return bundles
+
+def test_build_sis_zip_writes_each_table_as_a_csv_member():
+    members = zip_members(build_sis_zip({'courses.csv': CANVAS_COURSES[['course_id']], 'enrollments.csv': ENROLLMENTS}))
+    assert list(members) == ['courses.csv', 'enrollments.csv']
+    assert members['enrollments.csv'].values.tolist() == ENROLLMENTS.values.tolist()
+
+def test_bundles_carry_only_the_tables_with_changes_and_snapshot_on_success(tmp_path, posted):
+    output_root = str(tmp_path)
+    uploads = {'T1': ('enrollments_delta.csv', ENROLLMENTS, ENROLLMENTS)}
+    post_sis_bundle(uploads, CANVAS_COURSES, 'token', 'canvas', '1', True, output_root, ('users_delta.csv', USERS))
+    assert list(posted[0]) == ['users.csv', 'courses.csv', 'enrollments.csv']
+    assert posted[0]['courses.csv']['course_id'].tolist() == ['c100001']
+    assert sorted(os.listdir(tmp_path / 'snapshots')) == ['courses.parquet', 'enrollments_T1.parquet', 'users.parquet']
+
+    # Courses are unchanged since the snapshot, so only the users go out, and with nothing at all no bundle is posted
+    post_sis_bundle({}, CANVAS_COURSES, 'token', 'canvas', '1', True, output_root, ('users_delta.csv', USERS))
+    assert list(posted[1]) == ['users.csv']
+    assert post_sis_bundle({}, CANVAS_COURSES, 'token', 'canvas', '1', True, output_root) is None
+    assert len(posted) == 2
+
+def test_failed_imports_leave_the_snapshots_alone(tmp_path, posted):
+    posted.state = 'failed_with_messages'
+    uploads = {'T1': ('enrollments_delta.csv', ENROLLMENTS, ENROLLMENTS)}
+    sis_import = post_sis_bundle(uploads, CANVAS_COURSES, 'token', 'canvas', '1', True, str(tmp_path), ('users_delta.csv', USERS))
+    assert sis_import['workflow_state'] == 'failed_with_messages'
+    assert list(posted[0]) == ['users.csv', 'courses.csv', 'enrollments.csv']
+    assert not (tmp_path / 'snapshots').exists()
@@ -0,0 +1,63 @@
+import pandas as pd
+from course_preprocessing import plain_ids, prefixed_ids
+from overrides import apply_overrides
+
+COLUMNS = ['course_name', 'course_id', 'name', 'user_id', 'role', 'status', 'term_id']
+ENROLLMENTS = [
+    ['Maths', 'c100001', 'Lee, Kim', 'u000001', 'student', 'active', 'T1'],
+    ['Maths', 'c100001', 'Ng, Zoe', 'u000002', 'student', 'active', 'T1'],
+    ['Art', 'c100002', 'Lee, Kim', 'u000001', 'student', 'active', 'T2'],
+    ['Art', 'c100002', 'Smith, Anna', 'u000101', 'teacher', 'active', 'T2'],
+]
+TERM_MAP = {'100001': 'T1', '100002': 'T2', '100003': 'T2'}
+MERGE_MAP = {'100003': '100002'}
+
+def enrollments():
+    df = pd.DataFrame(ENROLLMENTS, columns=COLUMNS, dtype=object)
+    return df.astype({'role': 'category', 'status': 'category', 'term_id': 'category'})
+
+def apply(tmp_path, rows):
+    override_path = tmp_path / 'override.csv'
+    override_path.write_text('course_name,course_id,name,user_id,role,status,term_id,action\n' + ''.join(row + '\n' for row in rows))
+    result = apply_overrides(enrollments(), str(override_path), TERM_MAP, MERGE_MAP)
+    return sorted(tuple(row) for row in result[['course_id', 'user_id', 'role', 'status', 'term_id']].astype(str).values)
+
+def test_adds_take_the_course_term_and_follow_merge_codes(tmp_path):
+    result = apply(tmp_path, ['Art,100003,"Ng, Zoe",2,ta,,,'])
+    assert ('c100002', 'u000002', 'ta', 'active', 'T2') in result
+    assert len(result) == 5
+
+def test_add_replaces_an_existing_enrollment_in_the_course(tmp_path):
+    result = apply(tmp_path, ['Maths,c100001,"Lee, Kim",u000001,ta,active,T1,add'])
+    assert [row for row in result if row[:2] == ('c100001', 'u000001')] == [('c100001', 'u000001', 'ta', 'active', 'T1')]
+    assert len(result) == 4
+
+def test_drops_with_blank_or_star_fields_match_anything(tmp_path):
+    assert apply(tmp_path, [',*,,1,,,,drop']) == [
+        ('c100001', 'u000002', 'student', 'active', 'T1'),
+        ('c100002', 'u000101', 'teacher', 'active', 'T2'),
+    ]
+    assert len(apply(tmp_path, [',,,u000001,,,T2,drop'])) == 3
+
+def test_drops_apply_before_adds_and_bad_rules_are_skipped(tmp_path, capsys):
+    result = apply(tmp_path, [
+        ',,,,,,T1,drop',
+        'Maths,100001,"Ng, Zoe",2,student,,,add',
+        ',,,,,,,drop',
+        'Maths,100001,,3,student,,,enroll',
+        'Maths,,,3,student,,,add',
+    ])
+    assert [row for row in result if row[4] == 'T1'] == [('c100001', 'u000002', 'student', 'active', 'T1')]
+    output = capsys.readouterr().out
+    assert 'drop matching every enrollment' in output and 'unknown action' in output
+    assert 'Skipping 1 override rows: add missing user_id or course_id' in output
+
+def test_missing_override_file_changes_nothing(tmp_path):
+    df = enrollments()
+    assert apply_overrides(df, str(tmp_path / 'override.csv')) is df
+
+def test_id_helpers_render_numbers_and_keep_other_values():
+    values = pd.Series(['12', '12.0', None, 'c100001', 'x'], dtype=object)
+    ids = prefixed_ids(values, 'u')
+    assert ids.drop(2).tolist() == ['u000012', 'u000012', 'c100001', 'x'] and pd.isna(ids[2])
+    assert plain_ids(pd.Series([12.0, None, 7.0])).tolist()[::2] == ['12', '7']
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+from student_preprocessing import preprocess_enrollment_data
+
+# Two exports: students listed before the first course header, blank and separator rows,
+# rows with a name but no ID, and a second file that opens under the first file's last course
+EXPORTS = {
+    'a.csv': [
+        'course_name,course_id,subject,name,,student_id',
+        ',,,"Early, Ann",,7',
+        'Maths 7A,1000,Maths,,,',
+        ',,,"Stu, One",,1',
+        ',,,,,',
+        '',
+        ',,,"Stu, Two",,2',
+        ',,,"No, Id",,',
+        'English 7A,1001,English,,,',
+        ',,,"Stu, Three",,3',
+        ',,,"Stu, One",,1',
+    ],
+    'b.csv': [
+        'course_name,course_id,subject,name,,student_id',
+        ',,,"Carried, Over",,4',
+        'Science 8B,1002,Science,,,',
+        ',,,,,',
+        ',,,"Stu, Five",,5',
+        'Empty 9Z,1003,Art,,,',
+        'Drama 9A,1004,Drama,,,',
+        ',,,"Stu, Six",,6',
+    ],
+}
+
+def baseline_parse(directory):
+    """The original row-by-row parser, kept as the reference for the vectorized one."""
+    files = sorted(directory.glob('*.csv'))
+    df = pd.concat([pd.read_csv(file) for file in files], ignore_index=True)
+    current_course = {"name": None, "id": None, "subject": None}
+    processed_rows = []
+    for _, row in df.iterrows():
+        if pd.notna(row.iloc[1]) and pd.notna(row.iloc[2]):
+            current_course = {"name": row.iloc[0], "id": str(int(row.iloc[1])), "subject": row.iloc[2]}
+        elif pd.notna(row.iloc[3]) and pd.notna(row.iloc[5]):
+            processed_rows.append({
+                "course_name": current_course["name"],
+                "course_id": current_course["id"],
+                "subject": current_course["subject"],
+                "name": row.iloc[3],
+                "user_id": str(int(row.iloc[5])),
+            })
+    processed_df = pd.DataFrame(processed_rows)
+    processed_df['role'] = 'student'
+    return processed_df
+
+def _comparable(df):
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+@pytest.fixture
+def export_dir(tmp_path):
+    for name, lines in EXPORTS.items():
+        (tmp_path / name).write_text('\n'.join(lines) + '\n')
+    return tmp_path
+
+@pytest.mark.parametrize('chunksize', [None, 1, 2, 3, 5])
+def test_matches_baseline_parser(export_dir, chunksize):
+    expected = baseline_parse(export_dir)
+    actual = preprocess_enrollment_data(str(export_dir), chunksize=chunksize)
+    pd.testing.assert_frame_equal(_comparable(actual), _comparable(expected))
+
+def test_parallel_workers_carry_courses_across_files(export_dir):
+    expected = baseline_parse(export_dir)
+    actual = preprocess_enrollment_data(str(export_dir), workers=2)
+    pd.testing.assert_frame_equal(_comparable(actual), _comparable(expected))
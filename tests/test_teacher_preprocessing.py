@@ -0,0 +1,27 @@
+import pandas as pd
+from file_handling import iter_csv_chunks, load_and_combine_csv, list_csv_files
+from teacher_preprocessing import melt_teacher_file, melt_teachers
+
+EXPORTS = {
+    'a.csv': [
+        'course_name,course_id,subject,teacher,teacher_2,',
+        'Maths 7A,1000,Maths,"Smith, Jo","Lee, Al",',
+        'English 7A,1001,English,"Lee, Al",,',
+    ],
+    'b.csv': [
+        'course_name,course_id,subject,teacher,teacher_2,',
+        'Science 8B,1002,Science,"Brown, Sam",,',
+        'Drama 9A,1003,Drama,"Smith, Jo","Brown, Sam",',
+    ],
+}
+
+def test_parse_modes_list_teachers_in_the_same_order(tmp_path):
+    for name, lines in EXPORTS.items():
+        (tmp_path / name).write_text('\n'.join(lines) + '\n')
+    combined = melt_teachers(load_and_combine_csv(str(tmp_path)))
+    per_file = pd.concat([melt_teacher_file(file) for file in list_csv_files(str(tmp_path))], ignore_index=True)
+    chunked = pd.concat([melt_teachers(chunk) for chunk in iter_csv_chunks(str(tmp_path), 1)], ignore_index=True)
+
+    assert combined['name'].tolist() == ['Smith, Jo', 'Lee, Al', 'Lee, Al', 'Brown, Sam', 'Smith, Jo', 'Brown, Sam']
+    pd.testing.assert_frame_equal(per_file, combined)
+    pd.testing.assert_frame_equal(chunked, combined)
@@ -0,0 +1,71 @@
+import os
+import pandas as pd
+import teacher_resolver
+from file_handling import load_cached
+from teacher_preprocessing import preprocess_teacher_enrollments, write_teacher_report
+from teacher_resolver import build_name_index, resolve_names, load_name_index, load_staff
+
+STAFF = pd.DataFrame({
+    'SURNAME': ['Smith', 'Nguyen', 'Brown', 'Brown', 'Lee', 'Lee'],
+    'NAME': ['Anna', 'Zoë', 'Sam', 'Sam', 'Kim', 'Kym'],
+    'USER ID': ['101', '102', '103', '104', '105', '106'],
+})
+
+def resolve(*names):
+    user_ids, report_df = resolve_names(pd.Series(names), build_name_index(STAFF))
+    return user_ids.tolist(), report_df
+
+def test_exact_matches_ignore_case_accents_and_punctuation():
+    user_ids, report_df = resolve('SMITH, Anna', 'Nguyen,  Zoe', 'smith - anna')
+    assert user_ids == ['101', '102', '101']
+    assert report_df.empty
+
+def test_shared_names_are_never_guessed():
+    user_ids, report_df = resolve('Brown, Sam')
+    assert pd.isna(user_ids[0])
+    assert report_df['status'].tolist() == ['unresolved']
+
+def test_clear_misspellings_are_fuzzy_matched_and_reported():
+    user_ids, report_df = resolve('Smithe, Anna', 'Nguyen, Zoe')
+    assert user_ids == ['101', '102']
+    assert report_df[['name', 'status', 'user_id']].values.tolist() == [['Smithe, Anna', 'fuzzy', '101']]
+
+def test_close_calls_between_two_people_stay_unresolved():
+    user_ids, report_df = resolve('Lee, Kam', 'Unknown, Relief')
+    assert all(pd.isna(user_id) for user_id in user_ids)
+    assert report_df['status'].tolist() == ['unresolved', 'unresolved']
+    assert report_df['candidates'][0].startswith('lee k')
+
+def test_teacher_report_survives_the_parse_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The staff name index is cached under the working directory
+    teacher_dir = tmp_path / 'teacher_enroll'
+    teacher_dir.mkdir()
+    (teacher_dir / 'teachers.csv').write_text(
+        'course_name,course_id,subject,teacher,\n'
+        'Maths,100,MA,"Smith, Anna","Relief, Staff"\n'
+    )
+    teacher_ids_path = tmp_path / 'teacher_ids.csv'
+    STAFF.to_csv(teacher_ids_path, index=False)
+    inputs = [str(teacher_dir / 'teachers.csv'), str(teacher_ids_path)]
+    report_path = tmp_path / 'out' / 'unresolved_teachers.csv'
+
+    for _ in range(2):
+        if report_path.exists():
+            report_path.unlink()
+        teachers_df, report_df = load_cached('teachers', inputs, preprocess_teacher_enrollments, str(teacher_dir), None, None, str(teacher_ids_path), cache_dir=str(tmp_path / 'cache'))
+        write_teacher_report(report_df, str(report_path))
+        assert teachers_df['user_id'].tolist() == ['101']
+        assert pd.read_csv(report_path)['name'].tolist() == ['Relief, Staff']
+
+    write_teacher_report(report_df.iloc[:0], str(report_path))
+    assert not os.path.exists(report_path)
+
+def test_the_staff_export_is_parsed_once_for_the_index_and_the_users_table(tmp_path, monkeypatch):
+    teacher_ids_path = str(tmp_path / 'teacher_ids.csv')
+    STAFF.to_csv(teacher_ids_path, index=False)
+    parsed = []
+    monkeypatch.setattr(teacher_resolver, 'load_csv', lambda file_path: parsed.append(file_path) or STAFF)
+
+    load_name_index(teacher_ids_path, str(tmp_path / 'cache'))
+    assert load_staff(teacher_ids_path) is STAFF
+    assert parsed == [teacher_ids_path]
@@ -0,0 +1,29 @@
+import pandas as pd
+from user_sync import build_users, write_users, save_user_fingerprints, collect_user_upload
+
+STUDENTS = pd.DataFrame({'user_id': ['12', '12', '34', None], 'name': ['Lee, Kim', 'Lee, Kim', 'Prince', 'Ng, Zoe']}, dtype=object)
+STAFF = pd.DataFrame({'SURNAME': ['Smith '], 'NAME': [' Anna'], 'USER ID': ['34']}, dtype=object)
+
+def test_users_come_from_staff_and_student_lists_without_login_ids():
+    users_df = build_users(STUDENTS, STAFF)
+    assert users_df[['user_id', 'first_name', 'last_name', 'sortable_name']].values.tolist() == [
+        ['u000012', 'Kim', 'Lee', 'Lee, Kim'],
+        ['u000034', 'Anna', 'Smith', 'Smith, Anna'],
+    ]
+    assert users_df['login_id'].isna().all()
+
+def test_only_new_and_changed_users_are_written_after_a_post(tmp_path):
+    output_root = str(tmp_path)
+    users_df = build_users(STUDENTS, STAFF)
+
+    delta_path, delta_df = write_users(users_df, '{number}@school.example', output_root)
+    assert delta_df['login_id'].tolist() == ['12@school.example', '34@school.example']
+    save_user_fingerprints(delta_df, str(tmp_path / 'snapshots'))
+
+    assert write_users(users_df, '{number}@school.example', output_root) is None
+    assert collect_user_upload(output_root) is None
+
+    renamed = users_df.assign(first_name=['Kym', 'Anna'])
+    delta_path, delta_df = write_users(renamed, '{number}@school.example', output_root)
+    assert delta_df['user_id'].tolist() == ['u000012']
+    assert collect_user_upload(output_root)[1]['first_name'].tolist() == ['Kym']
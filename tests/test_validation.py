@@ -0,0 +1,49 @@
+import pandas as pd
+from validation import validate_enrollments, known_user_index
+
+COLUMNS = ['course_id', 'user_id', 'role', 'status', 'term_id']
+COURSES = pd.DataFrame({
+    'MS_COURSE_ID': ['100001', '100002', '100003', '100004'],
+    'course_id': ['c100001', 'c100002', 'c100003', 'c100004'],
+    'CANVAS_NEEDED': ['Y', 'N', 'Y', 'Y'],
+    'MERGE_CODE': [None, None, '100002', '100009'],
+}, dtype=object)
+
+def enrollments(*rows):
+    return pd.DataFrame([row + ('student', 'active', 'T1') for row in rows], columns=COLUMNS, dtype=object)
+
+def validate(tmp_path, df, user_index=None):
+    report_path = tmp_path / 'out' / 'quarantined_enrollments.csv'
+    return validate_enrollments(df, COURSES, str(report_path), user_index), report_path
+
+def test_duplicates_are_dropped_and_nothing_is_reported(tmp_path):
+    valid, report_path = validate(tmp_path, enrollments(('c100001', 'u000001'), ('c100001', 'u000001'), ('c100001', 'u000002')))
+    assert valid['user_id'].tolist() == ['u000001', 'u000002']
+    assert not report_path.exists()
+
+def test_missing_unknown_users_and_non_canvas_courses_are_quarantined(tmp_path):
+    df = enrollments(('c100001', 'nan'), ('c100001', 'u000009'), ('c100002', 'u000001'), ('c100001', 'u000001'))
+    valid, report_path = validate(tmp_path, df.astype({'user_id': 'category'}), known_user_index(['u000001', 'x12', None]))
+
+    assert valid['user_id'].tolist() == ['u000001']
+    report = pd.read_csv(report_path, dtype=str, keep_default_na=False)
+    assert report[['course_id', 'user_id', 'reason']].values.tolist() == [
+        ['c100001', 'nan', 'missing user_id'],
+        ['c100001', 'u000009', 'unknown user_id'],
+        ['c100002', 'u000001', 'course not a Canvas course in courses.csv'],
+    ]
+
+def test_without_a_user_index_only_malformed_ids_are_unknown(tmp_path):
+    valid, report_path = validate(tmp_path, enrollments(('c100001', 'u000009'), ('c100001', '000009')))
+    assert valid['user_id'].tolist() == ['u000009']
+    assert pd.read_csv(report_path, dtype=str)['reason'].tolist() == ['unknown user_id']
+
+def test_merge_codes_into_courses_canvas_never_receives_are_reported(tmp_path, capsys):
+    validate(tmp_path, enrollments(('c100001', 'u000001')))
+    assert '2 courses are merged into courses Canvas will not receive: 100003, 100004' in capsys.readouterr().out
+
+def test_a_stale_report_is_removed_once_every_row_passes(tmp_path):
+    _, report_path = validate(tmp_path, enrollments(('c100002', 'u000001')))
+    assert report_path.exists()
+    validate(tmp_path, enrollments(('c100001', 'u000001')))
+    assert not report_path.exists()
@@ -0,0 +1,111 @@
+import pandas as pd
+import os
+from course_preprocessing import prefixed_ids
+from file_handling import write_csv_atomic
+from incremental_sync import SNAPSHOT_DIR, write_parquet_atomic
+from instrumentation import instrumented
+
+USER_COLUMNS = ['user_id', 'login_id', 'first_name', 'last_name', 'full_name', 'sortable_name', 'status']
+
+def split_names(names):
+    """Split "Surname, Name" into first and last names; a name without a comma is kept whole as the last name."""
+    parts = names.astype(str).str.split(',', n=1, expand=True).reindex(columns=[0, 1])
+    return parts[1].str.strip().fillna(''), parts[0].str.strip()
+
+@instrumented('build_users')
+def build_users(students_df, teacher_ids_df):
+    """
+    Build the Canvas users table from the staff export and the student names in the student lists.
+
+    Args:
+        students_df (pd.DataFrame): Preprocessed student enrollments with name and raw user_id columns.
+        teacher_ids_df (pd.DataFrame): Staff export with SURNAME, NAME and USER ID columns.
+
+    Returns:
+        pd.DataFrame: One row per user in the users.csv layout, with u%06d IDs as in format_ids.
+            The staff export wins when a student list uses the same ID. login_id is left blank
+            for assign_login_ids, as the exports hold no login IDs.
+    """
+    students = students_df[['user_id', 'name']].dropna().drop_duplicates('user_id')
+    first_names, last_names = split_names(students['name'])
+    staff = teacher_ids_df.dropna(subset=['USER ID'])
+    users_df = pd.concat([
+        pd.DataFrame({'user_id': staff['USER ID'], 'first_name': staff['NAME'].str.strip(), 'last_name': staff['SURNAME'].str.strip()}),
+        pd.DataFrame({'user_id': students['user_id'], 'first_name': first_names, 'last_name': last_names}),
+    ], ignore_index=True)
+
+    users_df['user_id'] = prefixed_ids(users_df['user_id'], 'u')
+    users_df = users_df[users_df['user_id'].astype(str).str.fullmatch(r'u\d+')].drop_duplicates('user_id')
+    users_df = users_df.fillna({'first_name': '', 'last_name': ''})
+    users_df['login_id'] = None
+    users_df['full_name'] = (users_df['first_name'] + ' ' + users_df['last_name']).str.strip()
+    users_df['sortable_name'] = (users_df['last_name'] + ', ' + users_df['first_name']).str.strip(', ')
+    users_df['status'] = 'active'
+    return users_df[USER_COLUMNS].sort_values('user_id', ignore_index=True)
+
+def assign_login_ids(users_df, login_id_format):
+    """
+    Fill in login_id from a format string such as "{number}@school.example" or "{first_name}.{last_name}".
+    Fields are user_id (u000123), number (123), first_name and last_name.
+    """
+    users_df = users_df.copy()
+    users_df['login_id'] = [
+        login_id_format.format(user_id=user_id, number=int(user_id[1:]), first_name=first_name, last_name=last_name)
+        for user_id, first_name, last_name in zip(users_df['user_id'], users_df['first_name'], users_df['last_name'])
+    ]
+    return users_df
+
+def fingerprint_users(users_df):
+    """64-bit hash of each user's row, so changes can be detected without keeping every posted value."""
+    return pd.util.hash_pandas_object(users_df[USER_COLUMNS].astype(str), index=False).to_numpy()
+
+def load_user_fingerprints(snapshot_dir=SNAPSHOT_DIR):
+    """User IDs and fingerprints from the last successful post, or None if users have never been posted."""
+    file_path = os.path.join(snapshot_dir, 'users.parquet')
+    if not os.path.exists(file_path):
+        return None
+    return pd.read_parquet(file_path)
+
+def save_user_fingerprints(users_df, snapshot_dir=SNAPSHOT_DIR):
+    """Record fingerprints for the users that were just posted, keeping earlier fingerprints for the rest."""
+    fingerprints_df = pd.DataFrame({'user_id': users_df['user_id'].astype(str), 'fingerprint': fingerprint_users(users_df)})
+    previous_df = load_user_fingerprints(snapshot_dir)
+    if previous_df is not None:
+        fingerprints_df = pd.concat([previous_df[~previous_df['user_id'].isin(fingerprints_df['user_id'])], fingerprints_df], ignore_index=True)
+    write_parquet_atomic(fingerprints_df, os.path.join(snapshot_dir, 'users.parquet'))
+
+def diff_users(users_df, fingerprints_df):
+    """Users that are new or whose row changed since their fingerprint was recorded."""
+    if fingerprints_df is None:
+        return users_df
+    current = pd.MultiIndex.from_arrays([users_df['user_id'].astype(str), fingerprint_users(users_df)])
+    previous = pd.MultiIndex.from_frame(fingerprints_df[['user_id', 'fingerprint']])
+    return users_df[~current.isin(previous)]
+
+def write_users(users_df, login_id_format, output_root='temp_outputs'):
+    """
+    Write users.csv with every user and users_delta.csv with the users to post, with login IDs from login_id_format.
+
+    Returns:
+        tuple or None: (delta_path, delta_df), or None when no user changed since the last post.
+    """
+    users_df = assign_login_ids(users_df, login_id_format)
+    write_csv_atomic(users_df, os.path.join(output_root, 'users.csv'))
+    delta_df = diff_users(users_df, load_user_fingerprints(os.path.join(output_root, 'snapshots')))
+    delta_path = os.path.join(output_root, 'users_delta.csv')
+    if delta_df.empty:
+        # Remove any delta left by an earlier run so a later post stage cannot pick it up
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
+        print("No user changes since the last post.")
+        return None
+    write_csv_atomic(delta_df, delta_path)
+    print(f"Users CSV file created: {delta_path} ({len(delta_df)} of {len(users_df)} users)")
+    return delta_path, delta_df
+
+def collect_user_upload(output_root='temp_outputs'):
+    """Rebuild the user upload written by an earlier write_users run from the file on disk."""
+    delta_path = os.path.join(output_root, 'users_delta.csv')
+    if not os.path.exists(delta_path):
+        return None
+    return delta_path, pd.read_csv(delta_path, dtype=str, keep_default_na=False)
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import os
+from instrumentation import instrumented
+
+DEDUP_KEY = ['user_id', 'course_id', 'role']
+# Values that mean a user ID was lost somewhere upstream
+MISSING_IDS = {'', 'nan', 'None'}
+# Canvas user IDs as written by format_ids
+USER_ID_PATTERN = r'u\d+'
+
+def _valid_values(values, is_valid):
+    """
+    Evaluate is_valid once per distinct value and broadcast the result to every row.
+    Blanks are invalid. Categorical columns reuse their categories and codes.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    valid = np.asarray(is_valid(pd.Series(uniques, dtype=object)), dtype=bool)
+    return np.append(valid, False).take(codes)
+
+def canvas_course_index(courses_df):
+    """Canvas course IDs of the courses flagged CANVAS_NEEDED=Y."""
+    # Kept as plain objects: isin against an Arrow string index falls back to a Python loop
+    return pd.Index(courses_df.loc[courses_df['CANVAS_NEEDED'] == 'Y', 'course_id'].dropna().astype(str).unique(), dtype=object)
+
+def known_user_index(*user_ids):
+    """
+    Well-formed user IDs enrollments may use, from the users table and the enrollments added by hand.
+    Kept as plain objects for the same reason as canvas_course_index.
+    """
+    ids = pd.Index(pd.concat([pd.Series(list(values), dtype=object) for values in user_ids]).dropna().astype(str).unique(), dtype=object)
+    return ids[np.asarray(ids.str.fullmatch(USER_ID_PATTERN), dtype=bool)]
+
+def check_merge_codes(courses_df):
+    """
+    Courses whose MERGE_CODE points at a course that is missing from courses.csv or not needed on Canvas.
+    Their enrollments would be moved into a course Canvas never receives.
+    """
+    canvas_needed = courses_df.set_index('MS_COURSE_ID')['CANVAS_NEEDED']
+    canvas_needed = canvas_needed[~canvas_needed.index.duplicated()]
+    merged = courses_df[courses_df['MERGE_CODE'].notna()]
+    target_flags = merged['MERGE_CODE'].map(canvas_needed)
+    bad = (target_flags != 'Y').to_numpy()
+    reasons = np.where(target_flags[bad].isna(), 'merge code not in courses.csv', 'merge code not needed on Canvas')
+    return merged[bad].assign(reason=reasons)
+
+@instrumented('validate_enrollments')
+def validate_enrollments(full_enrollment_df, courses_df, report_path='temp_outputs/quarantined_enrollments.csv', user_index=None):
+    """
+    Drop duplicate enrollments and quarantine rows Canvas would reject, before anything is written.
+
+    Duplicates share a user, course and role; the first is kept. Rows with a missing or "nan"
+    user ID, a user ID not in user_index (from known_user_index; without one, any u000123 ID passes),
+    or a course that is not a Canvas-needed course in courses.csv, are written to
+    report_path with the reason and left out of the upload.
+
+    Returns:
+        pd.DataFrame: Enrollments that passed every check.
+    """
+    course_index = canvas_course_index(courses_df)
+    duplicated = full_enrollment_df.duplicated(subset=DEDUP_KEY).to_numpy()
+    if duplicated.any():
+        print(f"Removed {duplicated.sum()} duplicate enrollments")
+        full_enrollment_df = full_enrollment_df[~duplicated]
+    checks = {
+        'missing user_id': _valid_values(full_enrollment_df['user_id'], lambda ids: ~ids.astype(str).str.strip().isin(MISSING_IDS)),
+        'unknown user_id': _valid_values(
+            full_enrollment_df['user_id'],
+            (lambda ids: ids.isin(user_index)) if user_index is not None else (lambda ids: ids.astype(str).str.fullmatch(USER_ID_PATTERN)),
+        ),
+        'course not a Canvas course in courses.csv': _valid_values(full_enrollment_df['course_id'], lambda ids: ids.isin(course_index)),
+    }
+
+    # Each bad row is reported under the first check it fails
+    reasons = np.full(len(full_enrollment_df), None, dtype=object)
+    bad = np.zeros(len(full_enrollment_df), dtype=bool)
+    for reason, valid in checks.items():
+        failed = ~valid & ~bad
+        reasons[failed] = reason
+        bad |= failed
+
+    bad_merges = check_merge_codes(courses_df)
+    if not bad_merges.empty:
+        listed = ', '.join(bad_merges['MS_COURSE_ID'].astype(str)[:10]) + (', ...' if len(bad_merges) > 10 else '')
+        print(f"{len(bad_merges)} courses are merged into courses Canvas will not receive: {listed}")
+
+    if bad.any():
+        os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+        full_enrollment_df[bad].assign(reason=reasons[bad]).to_csv(report_path, index=False)
+        print(f"{bad.sum()} enrollments quarantined: {pd.Series(reasons[bad]).value_counts().to_dict()}. See {report_path}")
+    elif os.path.exists(report_path):
+        # A report left by an earlier run would describe rows that are no longer quarantined
+        os.remove(report_path)
+    return full_enrollment_df[~bad]